@@ -0,0 +1,400 @@
+"""Local stand-ins for yt-dlp, Spotify, the suggestion API and voice
+
+Everything here mimics just enough of the real interfaces for the bot's
+hot paths to run unchanged and offline.
+"""
+import time
+import asyncio
+import hashlib
+import threading
+import discord
+from aiohttp import web
+
+# Bytes in one 20 ms frame of 48 kHz stereo 16-bit PCM
+FRAME_SIZE = 3840
+
+
+def fake_id(query: str) -> str:
+    return hashlib.md5(query.encode()).hexdigest()[:11]
+
+
+class FakeYoutubeDL:
+    """yt_dlp.YoutubeDL replacement with a configurable blocking latency"""
+
+    latency = 0.5
+    # Flat listings skip the watch page and player JS, so they are cheaper
+    flat_latency = 0.2
+    calls = 0
+    playlist_size = 1000
+
+    def __init__(self, opts: dict = None):
+        self.opts = opts or {}
+
+    def extract_info(self, query: str, download: bool = False) -> dict:
+        FakeYoutubeDL.calls += 1
+        flat = bool(self.opts.get('extract_flat'))
+        time.sleep(self.flat_latency if flat else self.latency)
+        if flat and 'list=' in query:
+            return self.playlist(query)
+        term = query.split(':', 1)[-1]
+        entry = self.entry(term)
+        if flat:
+            return {'entries': [self.flat_entry(entry)]}
+        if query.startswith('ytsearch'):
+            return {'entries': [entry]}
+        return entry
+
+    @staticmethod
+    def flat_entry(entry: dict) -> dict:
+        return {
+            '_type': 'url',
+            'ie_key': 'Youtube',
+            'id': entry['id'],
+            'url': entry['webpage_url'],
+            'title': entry['title'],
+            'duration': entry['duration'],
+            'channel': entry['uploader'],
+            'thumbnails': [{'url': entry['thumbnail']}]
+        }
+
+    @staticmethod
+    def entry(term: str) -> dict:
+        vid = term.split('watch?v=', 1)[1] if 'watch?v=' in term else fake_id(term)
+        return {
+            'id': vid,
+            'url': f"https://rr1.googlevideo.com/videoplayback?expire={int(time.time()) + 21600}&id={vid}",
+            'title': f"Track {term[:40]}",
+            'webpage_url': f"https://www.youtube.com/watch?v={vid}",
+            'duration': 180,
+            'thumbnail': f"https://i.ytimg.com/vi/{vid}/hqdefault.jpg",
+            'uploader': 'Bench Artist',
+            'extractor': 'youtube',
+            'acodec': 'opus'
+        }
+
+    def playlist(self, query: str) -> dict:
+        """Flat playlist listing: ids and titles only, no stream URLs"""
+        entries = []
+        for n in range(min(self.playlist_size, self.opts.get('playlistend') or self.playlist_size)):
+            vid = fake_id(f"{query} {n}")
+            entries.append({
+                '_type': 'url',
+                'ie_key': 'Youtube',
+                'id': vid,
+                'url': f"https://www.youtube.com/watch?v={vid}",
+                'title': f"Playlist track {n}",
+                'duration': 180,
+                'channel': 'Bench Artist',
+                'thumbnails': [{'url': f"https://i.ytimg.com/vi/{vid}/hqdefault.jpg"}]
+            })
+        return {'_type': 'playlist', 'title': 'Bench playlist', 'extractor': 'youtube:tab', 'entries': entries}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeSpotify:
+    """spotipy.Spotify replacement serving synthetic tracks and playlists"""
+
+    latency = 0.15
+    playlist_size = 500
+
+    def __init__(self):
+        self.calls = 0
+
+    def _call(self):
+        self.calls += 1
+        time.sleep(self.latency)
+
+    @staticmethod
+    def _track(n) -> dict:
+        return {
+            'type': 'track',
+            'id': f"bench{n:017d}"[:22],
+            'name': f"Song {n}",
+            'artists': [{'name': f"Artist {n % 97}"}],
+            'duration_ms': 180000,
+            'album': {'name': 'Bench Album', 'images': []},
+            'external_urls': {'spotify': f"https://open.spotify.com/track/{n}"},
+            'external_ids': {'isrc': f"BENCH{n:07d}"}
+        }
+
+    def track(self, url, *args, **kwargs):
+        self._call()
+        return self._track(abs(hash(url)) % 100000)
+
+    def playlist_items(self, playlist_id, limit=100, offset=0, **kwargs):
+        self._call()
+        end = min(offset + limit, self.playlist_size)
+        # Different playlists hold different tracks
+        base = abs(hash(playlist_id)) % 1000 * 100000
+        return {
+            'items': [{'track': self._track(base + n)} for n in range(offset, end)],
+            'next': 'more' if end < self.playlist_size else None
+        }
+
+    def album(self, album_id, *args, **kwargs):
+        self._call()
+        page = self.album_tracks(album_id, limit=50, offset=0, timed=False)
+        return {'name': 'Bench Album', 'images': [], 'tracks': page}
+
+    def tracks(self, ids, *args, **kwargs):
+        self._call()
+        return {'tracks': [self._track(int(track_id[5:])) for track_id in ids[:50]]}
+
+    def album_tracks(self, album_id, limit=50, offset=0, timed=True, **kwargs):
+        if timed:
+            self._call()
+        end = min(offset + limit, self.playlist_size)
+        # Album listings carry simplified tracks: no album and no external ids
+        simplified = ('album', 'external_ids')
+        return {
+            'items': [
+                {k: v for k, v in self._track(n).items() if k not in simplified}
+                for n in range(offset, end)
+            ],
+            'next': 'more' if end < self.playlist_size else None
+        }
+
+
+class SuggestionServer:
+    """Local aiohttp server answering in the OpenSearch suggestion format"""
+
+    def __init__(self, latency: float = 0.08, port: int = 0):
+        self.latency = latency
+        self.port = port
+        self.requests = 0
+        self.runner = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        query = request.query.get('q', '')
+        words = ['remix', 'live', 'lyrics', 'acoustic', 'cover', 'official', 'slowed', 'instrumental']
+        return web.json_response([query, [f"{query} {w}" for w in words]])
+
+    async def start(self) -> str:
+        app = web.Application()
+        app.router.add_get('/ac/', self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', self.port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{port}/ac/"
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+
+
+class FakeAudio(discord.AudioSource):
+    """Audio source producing silent frames instead of spawning FFmpeg"""
+
+    frames_per_track = 100
+    created = 0
+    # FFmpeg output codec per source, decided the way FFmpegOpusAudio does
+    codecs = {}
+
+    def __init__(self, source, *args, opus: bool = False, **kwargs):
+        FakeAudio.created += 1
+        self.remaining = self.frames_per_track
+        self.opus = opus
+        self.frame = b'\xf8\xff\xfe' if opus else b'\x01\x00' * (FRAME_SIZE // 2)
+
+    def read(self) -> bytes:
+        if self.remaining <= 0:
+            return b''
+        self.remaining -= 1
+        return self.frame
+
+    def is_opus(self) -> bool:
+        return self.opus
+
+    @classmethod
+    def pcm(cls, source, *args, **kwargs):
+        return cls(source, opus=False)
+
+    @classmethod
+    def opus_audio(cls, source, *args, codec: str = None, **kwargs):
+        output = 'copy' if codec in ('opus', 'libopus') else 'libopus'
+        cls.codecs[output] = cls.codecs.get(output, 0) + 1
+        return cls(source, opus=True)
+
+
+class FakeVoiceClient:
+    """Voice client that consumes frames on its own thread like py-cord does"""
+
+    frame_interval = 0.02
+
+    def __init__(self, guild, channel):
+        self.guild = guild
+        self.channel = channel
+        self.source = None
+        self.frames = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._connected = True
+
+    def play(self, source, *, after=None):
+        if self.is_playing():
+            raise discord.ClientException('Already playing audio.')
+        self.source = source
+        # Each run gets its own stop flag so a stopped thread never resumes
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(after, self._stop), daemon=True)
+        self._thread.start()
+
+    def _run(self, after, stop):
+        next_frame = time.perf_counter()
+        while not stop.is_set():
+            data = self.source.read()
+            if not data:
+                break
+            self.frames += 1
+            if self.frame_interval:
+                next_frame += self.frame_interval
+                delay = next_frame - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+        stop.set()
+        if after:
+            # py-cord logs and swallows errors raised by after callbacks
+            try:
+                after(None)
+            except Exception:
+                pass
+
+    def is_playing(self) -> bool:
+        return self._thread is not None and not self._stop.is_set()
+
+    def is_paused(self) -> bool:
+        return False
+
+    def is_connected(self) -> bool:
+        return self._connected
+
+    def stop(self):
+        self._stop.set()
+
+    async def disconnect(self, force: bool = False):
+        self.stop()
+        self._connected = False
+        self.guild.voice_client = None
+
+
+class FakeMessage:
+    def __init__(self, channel, message_id: int):
+        self.channel = channel
+        self.id = message_id
+
+    async def edit(self, *args, **kwargs):
+        self.channel.edits += 1
+        return self
+
+
+class FakeChannel:
+    def __init__(self, guild, channel_id: int):
+        self.guild = guild
+        self.id = channel_id
+        self.members = []
+        self.sent = 0
+        self.edits = 0
+        self.last_message_id = None
+
+    async def send(self, *args, **kwargs):
+        self.sent += 1
+        self.last_message_id = self.id * 10000 + self.sent
+        return FakeMessage(self, self.last_message_id)
+
+    async def connect(self, **kwargs):
+        vc = FakeVoiceClient(self.guild, self)
+        self.guild.voice_client = vc
+        return vc
+
+
+class FakeGuild:
+    def __init__(self, guild_id: int):
+        self.id = guild_id
+        self.voice_client = None
+        self.text_channel = FakeChannel(self, guild_id * 10 + 1)
+        self.voice_channel = FakeChannel(self, guild_id * 10 + 2)
+
+
+class FakeMember:
+    bot = False
+
+    def __init__(self, user_id: int, guild: FakeGuild):
+        self.id = user_id
+        self.display_name = f"user{user_id}"
+        self.display_avatar = type('Avatar', (), {'url': f"https://cdn.example/{user_id}.png"})()
+        self.voice = type('VoiceState', (), {'channel': guild.voice_channel})()
+        guild.voice_channel.members.append(self)
+
+
+class FakeFollowup:
+    def __init__(self, ctx):
+        self.ctx = ctx
+
+    async def send(self, *args, **kwargs):
+        self.ctx.responded()
+
+
+class FakeContext:
+    """ApplicationContext stand-in recording time to first response"""
+
+    def __init__(self, guild: FakeGuild, author: FakeMember):
+        self.guild = guild
+        self.guild_id = guild.id
+        self.author = author
+        self.user = author
+        self.channel = guild.text_channel
+        self.followup = FakeFollowup(self)
+        self.started = time.perf_counter()
+        self.first_response = None
+        self.responses = 0
+        self.interaction = type('Interaction', (), {'user': author})()
+
+    def responded(self):
+        self.responses += 1
+        if self.first_response is None:
+            self.first_response = time.perf_counter()
+
+    async def defer(self, *args, **kwargs):
+        pass
+
+    async def respond(self, *args, **kwargs):
+        self.responded()
+
+
+class FakeBot:
+    """Just enough of discord.Bot for the Music cog and Player"""
+
+    def __init__(self, loop, guilds: dict):
+        self.loop = loop
+        self.guilds_by_id = guilds
+        self.user = type('User', (), {'id': 1})()
+        self.closed = False
+
+    def get_guild(self, guild_id: int):
+        return self.guilds_by_id.get(guild_id)
+
+    def get_channel(self, channel_id: int):
+        for guild in self.guilds_by_id.values():
+            for channel in (guild.text_channel, guild.voice_channel):
+                if channel.id == channel_id:
+                    return channel
+        return None
+
+    def is_closed(self) -> bool:
+        return self.closed
+
+    @property
+    def voice_clients(self):
+        return [g.voice_client for g in self.guilds_by_id.values() if g.voice_client]
+
+    def add_view(self, view, **kwargs):
+        pass
@@ -0,0 +1,495 @@
+"""Offline benchmark harness for SoundScape's hot paths
+
+yt-dlp, Spotify, the suggestion API and voice are replaced by the local
+stand-ins in bench.fakes, so every run is repeatable without network
+access or a Discord token. Examples:
+
+    python -m bench.run
+    python -m bench.run --guilds 50 --rate 20 --duration 15 --save bench/baseline.json
+    python -m bench.run --scenario queue --queue-size 10000 --compare bench/baseline.json
+    python -m bench.run --scenario noisy --noisy-playlists 8
+"""
+import os
+import gc
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import resource
+import platform
+import tracemalloc
+
+# The cog builds a Spotify client on import; give it dummy credentials
+os.environ.setdefault('SPOTIFY_CLIENT_ID', 'bench')
+os.environ.setdefault('SPOTIFY_CLIENT_SECRET', 'bench')
+
+import discord
+
+from bench.fakes import (
+    FakeYoutubeDL, FakeSpotify, SuggestionServer, FakeAudio, FakeVoiceClient,
+    FakeGuild, FakeMember, FakeContext, FakeBot
+)
+import utils.ytdl as ytdl
+import utils.autocomplete as autocomplete
+from utils.cache import RESOLUTION_CACHE
+from utils.admission import ADMISSION
+from utils.spotify import SPOTIFY_MATCHES
+from utils.track import Track
+from utils.player import Player
+from utils.embed import EmbedGenerator
+from cogs.music import Music
+
+SCENARIOS = ('resolve', 'spotify', 'play', 'playlist', 'noisy', 'queue', 'autocomplete')
+
+
+def percentiles(samples: list) -> dict:
+    if not samples:
+        return {'count': 0}
+    ordered = sorted(samples)
+
+    def pick(q):
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 3)
+
+    return {
+        'count': len(ordered),
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 3),
+        'p50_ms': pick(0.50),
+        'p95_ms': pick(0.95),
+        'p99_ms': pick(0.99),
+        'max_ms': round(ordered[-1] * 1000, 3)
+    }
+
+
+class LoopLagMonitor:
+    """Measure how late the event loop wakes a periodic sleeper"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples = []
+        self.task = None
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, time.perf_counter() - start - self.interval))
+
+    def __enter__(self):
+        self.task = asyncio.ensure_future(self._run())
+        return self
+
+    def __exit__(self, *exc):
+        self.task.cancel()
+
+    def report(self) -> dict:
+        return percentiles(self.samples)
+
+
+def install_fakes(args):
+    """Swap the external services for local stand-ins"""
+    FakeYoutubeDL.latency = args.ytdl_latency
+    FakeYoutubeDL.flat_latency = args.ytdl_flat_latency
+    FakeSpotify.latency = args.spotify_latency
+    FakeAudio.frames_per_track = args.frames_per_track
+    FakeVoiceClient.frame_interval = args.frame_interval
+    ytdl.load_youtube_dl().YoutubeDL = FakeYoutubeDL
+    discord.FFmpegPCMAudio = FakeAudio.pcm
+    discord.FFmpegOpusAudio = FakeAudio.opus_audio
+
+
+def reset_state():
+    """Forget everything cached by a previous scenario"""
+    RESOLUTION_CACHE.entries.clear()
+    RESOLUTION_CACHE.aliases.clear()
+    RESOLUTION_CACHE.hits = RESOLUTION_CACHE.stale = 0
+    RESOLUTION_CACHE.misses = RESOLUTION_CACHE.disk_hits = 0
+    SPOTIFY_MATCHES.memory.clear()
+    ADMISSION.users.clear()
+    ADMISSION.guilds.clear()
+    FakeYoutubeDL.calls = 0
+    FakeAudio.codecs.clear()
+    gc.collect()
+
+
+def make_queries(count: int, repeat_ratio: float, pool: int = 200) -> list:
+    """Synthetic queries where `repeat_ratio` of them hit a small popular set"""
+    popular = [f"popular song {n}" for n in range(pool)]
+    return [
+        random.choice(popular) if random.random() < repeat_ratio else f"unique song {n}"
+        for n in range(count)
+    ]
+
+
+async def bench_resolve(args) -> dict:
+    queries = make_queries(args.requests, args.repeat_ratio)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+
+    async def one(query):
+        async with semaphore:
+            start = time.perf_counter()
+            await ytdl.YTDLSource.create_source(query)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with LoopLagMonitor() as lag:
+        await asyncio.gather(*(one(q) for q in queries))
+    elapsed = time.perf_counter() - start
+    return {
+        'requests': len(queries),
+        'throughput_rps': round(len(queries) / elapsed, 2),
+        'latency': percentiles(latencies),
+        'loop_lag': lag.report(),
+        'extractions': FakeYoutubeDL.calls,
+        'cache': RESOLUTION_CACHE.stats(),
+        'pool': ytdl.YTDL_POOL.stats()
+    }
+
+
+async def bench_spotify(args) -> dict:
+    cog = Music(FakeBot(asyncio.get_running_loop(), {}))
+    cog.spotify.sp = fake = FakeSpotify()
+    urls = [
+        f"https://open.spotify.com/track/{n % max(1, int(args.requests * (1 - args.repeat_ratio)) or 1)}"
+        for n in range(args.requests)
+    ]
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+
+    async def one(url):
+        async with semaphore:
+            start = time.perf_counter()
+            await cog.spotify.get_track_info(url)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with LoopLagMonitor() as lag:
+        await asyncio.gather(*(one(u) for u in urls))
+    elapsed = time.perf_counter() - start
+    return {
+        'requests': len(urls),
+        'throughput_rps': round(len(urls) / elapsed, 2),
+        'latency': percentiles(latencies),
+        'loop_lag': lag.report(),
+        'api_calls': fake.calls
+    }
+
+
+async def bench_play(args) -> dict:
+    """N guilds issuing /music play at a fixed aggregate rate"""
+    guilds = {gid: FakeGuild(gid) for gid in range(1, args.guilds + 1)}
+    members = {gid: [FakeMember(gid * 1000 + u, g) for u in range(3)] for gid, g in guilds.items()}
+    bot = FakeBot(asyncio.get_running_loop(), guilds)
+    cog = Music(bot)
+    cog.spotify.sp = FakeSpotify()
+    queries = make_queries(int(args.rate * args.duration), args.repeat_ratio)
+
+    first_response, total = [], []
+
+    async def one(query):
+        gid = random.choice(list(guilds))
+        ctx = FakeContext(guilds[gid], random.choice(members[gid]))
+        await Music.play.callback(cog, ctx, query)
+        done = time.perf_counter()
+        total.append(done - ctx.started)
+        if ctx.first_response:
+            first_response.append(ctx.first_response - ctx.started)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    tasks = []
+    with LoopLagMonitor() as lag:
+        for query in queries:
+            tasks.append(asyncio.ensure_future(one(query)))
+            await asyncio.sleep(1 / args.rate)
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    frames = sum(g.voice_client.frames for g in guilds.values() if g.voice_client)
+    for guild in guilds.values():
+        if guild.voice_client:
+            await guild.voice_client.disconnect()
+    return {
+        'commands': len(queries),
+        'throughput_cps': round(len(queries) / elapsed, 2),
+        'time_to_first_response': percentiles(first_response),
+        'command_latency': percentiles(total),
+        'loop_lag': lag.report(),
+        'frames_played': frames,
+        'channel_messages': sum(g.text_channel.sent for g in guilds.values()),
+        'message_edits': sum(g.text_channel.edits for g in guilds.values()),
+        'audio_sources': FakeAudio.created,
+        'audio_codecs': dict(FakeAudio.codecs),
+        'queued_tracks': cog.gauges()['queued_tracks'],
+        'extractions': FakeYoutubeDL.calls,
+        'peak_traced_mb': round(peak / 1024 / 1024, 2)
+    }
+
+
+async def bench_playlist(args) -> dict:
+    """Enqueue latency for YouTube playlist links"""
+    FakeYoutubeDL.playlist_size = args.playlist_size
+    guilds = {gid: FakeGuild(gid) for gid in range(1, args.guilds + 1)}
+    cog = Music(FakeBot(asyncio.get_running_loop(), guilds))
+    first_response, total = [], []
+
+    with LoopLagMonitor() as lag:
+        for gid, guild in guilds.items():
+            ctx = FakeContext(guild, FakeMember(gid * 1000, guild))
+            await Music.play.callback(cog, ctx, f"https://www.youtube.com/playlist?list=PLbench{gid}")
+            total.append(time.perf_counter() - ctx.started)
+            first_response.append(ctx.first_response - ctx.started)
+
+    for guild in guilds.values():
+        if guild.voice_client:
+            await guild.voice_client.disconnect()
+    return {
+        'playlists': len(guilds),
+        'time_to_first_response': percentiles(first_response),
+        'command_latency': percentiles(total),
+        'loop_lag': lag.report(),
+        'queued_tracks': cog.gauges()['queued_tracks'],
+        'extractions': FakeYoutubeDL.calls
+    }
+
+
+async def bench_noisy(args) -> dict:
+    """Single plays in small guilds while one guild resolves Spotify playlists"""
+    FakeSpotify.playlist_size = args.playlist_size
+    guilds = {gid: FakeGuild(gid) for gid in range(1, args.guilds + 1)}
+    bot = FakeBot(asyncio.get_running_loop(), guilds)
+    cog = Music(bot)
+    cog.spotify.sp = FakeSpotify()
+
+    # Guild 1 is the noisy one: several users paste playlists at once
+    noisy = guilds[1]
+    flood = [
+        asyncio.ensure_future(Music.play.callback(
+            cog, FakeContext(noisy, FakeMember(1000 + n, noisy)),
+            f"https://open.spotify.com/playlist/bench{n}"
+        ))
+        for n in range(args.noisy_playlists)
+    ]
+    await asyncio.sleep(0.5)
+
+    small = [g for gid, g in guilds.items() if gid != 1]
+    members = {g.id: [FakeMember(g.id * 1000 + u, g) for u in range(3)] for g in small}
+    first_response, total, busy = [], [], 0
+
+    async def one(n):
+        nonlocal busy
+        guild = random.choice(small)
+        ctx = FakeContext(guild, random.choice(members[guild.id]))
+        await Music.play.callback(cog, ctx, f"unique small guild song {n}")
+        total.append(time.perf_counter() - ctx.started)
+        first_response.append(ctx.first_response - ctx.started)
+        busy += ctx.responses > 1
+
+    tasks = []
+    with LoopLagMonitor() as lag:
+        for n in range(int(args.rate * args.duration)):
+            tasks.append(asyncio.ensure_future(one(n)))
+            await asyncio.sleep(1 / args.rate)
+        await asyncio.gather(*tasks)
+
+    for task in flood:
+        task.cancel()
+    await asyncio.gather(*flood, return_exceptions=True)
+    for guild in guilds.values():
+        if guild.voice_client:
+            await guild.voice_client.disconnect()
+    return {
+        'small_guild_commands': len(tasks),
+        'time_to_first_response': percentiles(first_response),
+        'command_latency': percentiles(total),
+        'busy_replies': busy,
+        'loop_lag': lag.report(),
+        'noisy_tracks_queued': len(cog.players[1].queue) if 1 in cog.players else 0,
+        'extractions': FakeYoutubeDL.calls
+    }
+
+
+async def bench_queue(args) -> dict:
+    """Queue mutation, paging and rendering cost for a large queue"""
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    player = Player(FakeBot(asyncio.get_running_loop(), {}), 1)
+    for n in range(args.queue_size):
+        track = Track(
+            id=f"{n:011d}", title=f"Track {n}", duration=random.randint(60, 600),
+            webpage_url=f"https://www.youtube.com/watch?v={n:011d}",
+            url=f"https://rr1.googlevideo.com/videoplayback?id={n}"
+        )
+        track.requester = f"user{n % 25}"
+        track.requester_id = n % 25
+        player.queue.append(track)
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    pages = max(1, len(player.queue) // 10)
+    timings = {'render_cold': [], 'render_warm': [], 'remove': [], 'queue_list': []}
+    for _ in range(args.iterations):
+        page = random.randint(1, pages)
+        start = time.perf_counter()
+        player.queue_page(page)
+        timings['render_cold'].append(time.perf_counter() - start)
+        start = time.perf_counter()
+        player.queue_page(page)
+        timings['render_warm'].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        EmbedGenerator.queue_list(
+            tracks=player.queue.slice(0, 10), current=None, page=1, total_pages=pages,
+            total_tracks=len(player.queue), total_duration=player.queue.total_duration
+        )
+        timings['queue_list'].append(time.perf_counter() - start)
+
+        index = random.randrange(len(player.queue))
+        start = time.perf_counter()
+        track = player.queue.pop(index)
+        timings['remove'].append(time.perf_counter() - start)
+        player.queue.append(track)
+
+    # Bulk operations rebuild the whole queue, so run them fewer times
+    for n in range(min(args.iterations, 20)):
+        for name, operation in (
+            ('shuffle', lambda: player.queue.shuffle()),
+            ('dedupe', lambda: player.queue.dedupe()),
+            ('remove_requester', lambda: player.queue.remove_where(lambda t: t.requester_id == n % 25))
+        ):
+            start = time.perf_counter()
+            removed = operation()
+            timings.setdefault(name, []).append(time.perf_counter() - start)
+        # Put the removed requester's tracks back for the next round
+        player.queue.extend(
+            Track(
+                id=f"r{n}-{i:08d}", title=f"Readded {i}", duration=200,
+                requester=f"user{n % 25}", requester_id=n % 25
+            )
+            for i in range(removed)
+        )
+
+    result = {name: percentiles(samples) for name, samples in timings.items()}
+    result['queue_size'] = len(player.queue)
+    result['queue_memory_mb'] = round((after - before) / 1024 / 1024, 2)
+    return result
+
+
+async def bench_autocomplete(args) -> dict:
+    """Users typing queries character by character"""
+    server = SuggestionServer(latency=args.suggest_latency)
+    autocomplete.SUGGEST_URL = await server.start()
+    client = autocomplete.SuggestionClient()
+    phrases = make_queries(args.users, args.repeat_ratio, pool=20)
+    latencies = []
+
+    async def type_phrase(user_id, phrase):
+        for end in range(1, len(phrase) + 1):
+            start = time.perf_counter()
+            await client.suggest(phrase[:end], user_id=user_id)
+            latencies.append(time.perf_counter() - start)
+            await asyncio.sleep(args.keystroke_interval)
+
+    try:
+        with LoopLagMonitor() as lag:
+            await asyncio.gather(*(type_phrase(uid, p) for uid, p in enumerate(phrases)))
+    finally:
+        await client.close()
+        await server.stop()
+    return {
+        'keystrokes': len(latencies),
+        'latency': percentiles(latencies),
+        'loop_lag': lag.report(),
+        'outbound_requests': server.requests,
+        'client': client.stats()
+    }
+
+
+def compare(current: dict, baseline: dict, path: str = ''):
+    """Print every numeric metric next to its baseline value"""
+    for key, value in current.items():
+        name = f"{path}.{key}" if path else key
+        old = baseline.get(key) if isinstance(baseline, dict) else None
+        if isinstance(value, dict):
+            compare(value, old or {}, name)
+        elif isinstance(value, (int, float)) and isinstance(old, (int, float)):
+            change = f"{(value - old) / old * 100:+.1f}%" if old else "n/a"
+            print(f"  {name:<48} {old:>12} -> {value:<12} {change}")
+
+
+async def main(args) -> dict:
+    install_fakes(args)
+    runners = {
+        'resolve': bench_resolve,
+        'spotify': bench_spotify,
+        'play': bench_play,
+        'playlist': bench_playlist,
+        'noisy': bench_noisy,
+        'queue': bench_queue,
+        'autocomplete': bench_autocomplete
+    }
+    results = {}
+    for name in args.scenario or SCENARIOS:
+        reset_state()
+        print(f"running {name}...", file=sys.stderr)
+        results[name] = await runners[name](args)
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scenario', action='append', choices=SCENARIOS)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--repeat-ratio', type=float, default=0.5)
+    parser.add_argument('--guilds', type=int, default=20)
+    parser.add_argument('--rate', type=float, default=10, help="play commands per second")
+    parser.add_argument('--duration', type=float, default=10, help="seconds of play traffic")
+    parser.add_argument('--queue-size', type=int, default=10000)
+    parser.add_argument('--playlist-size', type=int, default=1000)
+    parser.add_argument('--noisy-playlists', type=int, default=4)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--users', type=int, default=30)
+    parser.add_argument('--keystroke-interval', type=float, default=0.08)
+    parser.add_argument('--ytdl-latency', type=float, default=0.5)
+    parser.add_argument('--ytdl-flat-latency', type=float, default=0.2)
+    parser.add_argument('--spotify-latency', type=float, default=0.15)
+    parser.add_argument('--suggest-latency', type=float, default=0.08)
+    parser.add_argument('--frames-per-track', type=int, default=150)
+    parser.add_argument('--frame-interval', type=float, default=0.02)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--save', help="write results as a JSON baseline")
+    parser.add_argument('--compare', help="compare against a saved JSON baseline")
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    random.seed(args.seed)
+    results = asyncio.run(main(args))
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'args': vars(args),
+            'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 2)
+        },
+        'results': results
+    }
+    print(json.dumps(report, indent=2))
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"\nCompared with {args.compare}:")
+        compare(results, baseline.get('results', {}))
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved baseline to {args.save}", file=sys.stderr)
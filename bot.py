@@ -1,9 +1,19 @@
+import time
+LAUNCHED = time.perf_counter()
+
 import os
 import sys
+import json
+import asyncio
+import hashlib
 import logging
 import discord
-from discord.ext import commands
 from dotenv import load_dotenv
+from utils.autocomplete import SuggestionClient
+from utils.cache import RESOLUTION_CACHE
+from utils.metrics import MetricsServer, StartupTimer
+from utils.spotify import SPOTIFY_MATCHES
+from utils.state import STATE_STORE
 
 # Configure logging
 logging.basicConfig(
@@ -17,6 +27,18 @@ logger = logging.getLogger('hertz')
 
 load_dotenv()
 
+startup = StartupTimer(LAUNCHED)
+startup.mark('imports')
+
+# Hash of the last command tree synced to Discord; sync is skipped while it
+# matches. It must outlive redeploys, so by default it sits next to STATE_DB
+# (the persistent volume) and only falls back to the working directory
+COMMAND_HASH_FILE = os.getenv('COMMAND_HASH_FILE') or os.path.join(
+    os.path.dirname(os.path.abspath(os.getenv('STATE_DB'))) if os.getenv('STATE_DB') else '',
+    '.command_hash'
+)
+FORCE_COMMAND_SYNC = os.getenv('FORCE_COMMAND_SYNC', '').lower() in ('1', 'true')
+
 # Validate critical environment variables
 required_envs = ['DISCORD_TOKEN', 'SPOTIFY_CLIENT_ID', 'SPOTIFY_CLIENT_SECRET']
 missing_envs = [var for var in required_envs if not os.getenv(var)]
@@ -36,12 +58,78 @@ except Exception as e:
     logger.error(f"Invalid activity type '{activity_type}': {str(e)}")
     activity_enum = discord.ActivityType.playing
 
+# Sharding: SHARD_COUNT ("auto" or a number) switches to AutoShardedBot;
+# SHARD_IDS (e.g. "0-3" or "0,2") limits this process to part of the
+# shard range so several processes can split the gateway between them
+shard_count = os.getenv('SHARD_COUNT', '').strip().lower()
+shard_ids = None
+if os.getenv('SHARD_IDS'):
+    shard_ids = []
+    for part in os.getenv('SHARD_IDS').split(','):
+        start, _, end = part.strip().partition('-')
+        shard_ids.extend(range(int(start), int(end or start) + 1))
+
+shard_options = {}
+if shard_count or shard_ids:
+    if shard_count and shard_count != 'auto':
+        shard_options['shard_count'] = int(shard_count)
+    elif shard_ids:
+        logger.error("SHARD_IDS requires a numeric SHARD_COUNT")
+        sys.exit(1)
+    if shard_ids:
+        shard_options['shard_ids'] = shard_ids
+    BotBase = discord.AutoShardedBot
+    logger.info(f"Sharding enabled: shards {shard_ids or 'all'} of {shard_count}")
+else:
+    BotBase = discord.Bot
+
 intents = discord.Intents.default()
 intents.message_content = True
 intents.voice_states = True
 
-bot = discord.Bot(
+class SoundScapeBot(BotBase):
+    """Bot that owns long-lived shared resources"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.suggestions = SuggestionClient()
+        self.metrics = None
+        self.commands_checked = False
+
+    async def start(self, *args, **kwargs):
+        # Metrics are opt-in: set METRICS_PORT to expose them locally
+        port = os.getenv('METRICS_PORT')
+        if port:
+            self.metrics = MetricsServer(
+                int(port), profiler=os.getenv('METRICS_PROFILER', '').lower() in ('1', 'true')
+            )
+            await self.metrics.start()
+        await super().start(*args, **kwargs)
+
+    async def login(self, token: str):
+        await super().login(token)
+        startup.mark('login')
+
+    async def on_connect(self):
+        # Replaces the unconditional sync in Bot.on_connect
+        if not self.commands_checked:
+            startup.mark('connect')
+
+    async def close(self):
+        if self.metrics:
+            await self.metrics.stop()
+        await self.suggestions.close()
+        await super().close()
+        # Voice clients are gone by now, so the saved state is final
+        if STATE_STORE:
+            STATE_STORE.flush_sync()
+        RESOLUTION_CACHE.writes.flush_sync()
+        SPOTIFY_MATCHES.writes.flush_sync()
+
+bot = SoundScapeBot(
     intents=intents,
+    **shard_options,
+    auto_sync_commands=False,
     activity=discord.Activity(
         type=activity_enum,
         name=activity_name
@@ -51,10 +139,54 @@ bot = discord.Bot(
 # Load cogs directly
 from cogs.music import Music
 bot.add_cog(Music(bot))
+startup.mark('cogs')
+
+
+def command_tree_hash() -> str:
+    """Stable hash of the commands this build registers"""
+    payload = sorted(
+        (cmd.to_dict() for cmd in bot.pending_application_commands), key=lambda c: c['name']
+    )
+    digest = hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+    return f"{bot.user.id}:{digest}"
+
+
+async def sync_commands_if_changed():
+    """Sync commands only when the tree differs from the last successful sync"""
+    digest = command_tree_hash()
+    try:
+        with open(COMMAND_HASH_FILE) as f:
+            stored = f.read().strip()
+    except OSError:
+        stored = None
+    if stored == digest and not FORCE_COMMAND_SYNC:
+        logger.info("Command tree unchanged since the last sync, skipping it")
+        return
+
+    logger.info("Syncing commands...")
+    await bot.sync_commands()
+    logger.info(f"Synced {len(bot.pending_application_commands)} commands")
+    try:
+        with open(COMMAND_HASH_FILE, 'w') as f:
+            f.write(digest)
+    except OSError as e:
+        logger.warning(f"Couldn't store the command hash: {str(e)}")
+
+
+def preload_modules():
+    """Import the lazily loaded libraries before the first command needs them"""
+    from utils.ytdl import load_youtube_dl
+    load_youtube_dl()
+    import spotipy  # noqa: F401
+
 
 @bot.event
 async def on_ready():
     logger.info(f'Logged in as {bot.user} (ID: {bot.user.id})')
+    if bot.commands_checked:
+        return
+    bot.commands_checked = True
+    startup.ready()
     
     # Generate invite URL
     permissions = discord.Permissions()
@@ -75,25 +207,17 @@ async def on_ready():
     
     # Sync commands with robust error handling
     try:
-        logger.info("Syncing commands...")
-        synced = await bot.sync_commands()
-        
-        if synced is None:
-            # Inspect registered commands
-            commands = bot.application_commands
-            logger.warning(f"Sync returned None! Registered commands: {len(commands)}")
-            
-            # Attempt alternative sync method
-            await bot.register_commands()
-            logger.info("Fallback command registration completed")
-        else:
-            logger.info(f"Synced {len(synced)} commands")
-            
+        await sync_commands_if_changed()
     except Exception as e:
         logger.error(f"Command sync failed: {str(e)}")
         # Detailed diagnostics
-        logger.info(f"Command count: {len(bot.application_commands)}")
-        logger.info(f"Command names: {[cmd.name for cmd in bot.application_commands]}")
+        logger.info(f"Command count: {len(bot.pending_application_commands)}")
+        logger.info(f"Command names: {[cmd.name for cmd in bot.pending_application_commands]}")
+    startup.mark('command_sync')
+
+    # Warm the heavy imports off the event loop now that we are ready
+    await asyncio.to_thread(preload_modules)
+    startup.mark('preload')
 
 if __name__ == '__main__':
     logger.info("Starting SoundScape bot...")
@@ -1,31 +1,231 @@
 import os
+import math
+import time
 import asyncio
 import discord
 import logging
 from discord.commands import SlashCommandGroup
-from discord.ext import commands
-from utils.player import Player
-from utils.ytdl import YTDLSource
+from contextlib import asynccontextmanager
+from discord.ext import commands, tasks
+from utils.player import Player, PlayerRegistry
+from utils.ytdl import YTDLSource, FAST_SEARCH, URL_RE
 from utils.spotify import SpotifyHandler
 from utils.autocomplete import get_search_suggestions
 from utils.embed import EmbedGenerator
+from utils.views import QueueView
+from utils.metrics import Counter, Gauge, Histogram
+from utils.state import STATE_STORE
+from utils.messages import MESSAGES
+from utils.popularity import POPULARITY
+from utils.audiocache import AUDIO_CACHE
+from utils.track import Track
+from utils.cache import RESOLUTION_CACHE
+from utils.admission import ADMISSION
 
 logger = logging.getLogger('hertz')
 
+# Concurrent YouTube lookups per Spotify playlist/album
+SPOTIFY_RESOLVE_CONCURRENCY = int(os.getenv('SPOTIFY_RESOLVE_CONCURRENCY', '4'))
+
+# Seconds a player may sit idle or alone before it is evicted
+IDLE_TIMEOUT = float(os.getenv('IDLE_TIMEOUT', '300'))
+REAP_INTERVAL = float(os.getenv('IDLE_REAP_INTERVAL', '60'))
+
+# Most played tracks kept resolved ahead of requests (0 disables), how
+# often they are checked, and whether their audio is downloaded too
+WARM_TOP_TRACKS = int(os.getenv('WARM_TOP_TRACKS', '20'))
+WARM_INTERVAL = float(os.getenv('WARM_INTERVAL', '300'))
+WARM_AUDIO = os.getenv('WARM_AUDIO', '').lower() in ('1', 'true')
+
+COMMAND_SECONDS = Histogram(
+    'soundscape_command_seconds', 'Slash command time from invocation to final response',
+    ('command',)
+)
+TRACKS_WARMED = Counter(
+    'soundscape_popular_tracks_warmed_total', 'Stream URLs re-resolved ahead of demand'
+)
+
 class Music(commands.Cog):
     def __init__(self, bot: discord.Bot):
         self.bot = bot
-        self.players = {}
+        self.players = PlayerRegistry(bot)
         self.spotify = SpotifyHandler(
             client_id=os.getenv('SPOTIFY_CLIENT_ID'),
             client_secret=os.getenv('SPOTIFY_CLIENT_SECRET')
         )
+        self.queue_view = None
+        self.resuming = set()
+        self.register_gauges()
         logger.info("Music cog initialized")
 
     def get_player(self, guild_id: int) -> Player:
         if guild_id not in self.players:
-            self.players[guild_id] = Player(self.bot)
-        return self.players[guild_id]
+            player = self.players[guild_id] = Player(self.bot, guild_id)
+            # Saved state is restored lazily, the first time a guild is used
+            state = STATE_STORE.load(guild_id) if STATE_STORE else None
+            if state:
+                player.restore(state)
+        player = self.players[guild_id]
+        player.touch()
+        return player
+
+    def gauges(self) -> dict:
+        """Live player, voice connection and queue size gauges"""
+        return {
+            'players': len(self.players),
+            'voice_connections': len(self.bot.voice_clients),
+            'queued_tracks': sum(len(p.queue) for p in self.players.values())
+        }
+
+    def register_gauges(self):
+        shard_of = self.players.shard_of
+
+        def per_shard(values) -> dict:
+            counts = {}
+            for shard_id in values:
+                counts[(shard_id,)] = counts.get((shard_id,), 0) + 1
+            return counts
+
+        Gauge(
+            'soundscape_players', 'Active guild players', ('shard',),
+            function=lambda: {
+                (shard_id,): len(players) for shard_id, players in self.players.shards.items()
+            }
+        )
+        Gauge(
+            'soundscape_voice_connections', 'Connected voice clients', ('shard',),
+            function=lambda: per_shard(shard_of(vc.guild.id) for vc in self.bot.voice_clients)
+        )
+        Gauge(
+            'soundscape_ffmpeg_processes', 'Voice clients with a live FFmpeg source', ('shard',),
+            function=lambda: per_shard(
+                shard_of(vc.guild.id) for vc in self.bot.voice_clients
+                if vc.is_playing() or vc.is_paused()
+            )
+        )
+        Gauge(
+            'soundscape_queue_length', 'Queued tracks per guild', ('shard', 'guild'),
+            function=lambda: {
+                (shard_of(gid), gid): len(p.queue) for gid, p in self.players.items()
+            }
+        )
+        Gauge(
+            'soundscape_shard_latency_seconds', 'Gateway heartbeat latency per shard', ('shard',),
+            function=lambda: {
+                (shard_id,): latency for shard_id, latency in getattr(
+                    self.bot, 'latencies', [(0, self.bot.latency)]
+                )
+            }
+        )
+
+    @asynccontextmanager
+    async def resolution_slot(self, ctx: discord.ApplicationContext, bypass: bool = False):
+        """Hold one of the guild's fair-queued resolution slots
+
+        A request queued behind more than a full round of slots is told its
+        position right away rather than sitting on the deferred response.
+        """
+        if bypass:
+            yield
+            return
+        ticket = ADMISSION.enqueue(ctx.guild.id)
+        if ticket.position > ADMISSION.queue.slots:
+            try:
+                embed = EmbedGenerator.warning(f"Busy, queued at position {ticket.position}")
+                await ctx.respond(embed=embed)
+            except Exception as e:
+                logger.error(f"Queue notice failed: {str(e)}")
+        async with ticket:
+            yield
+
+    async def cog_before_invoke(self, ctx: discord.ApplicationContext):
+        ctx.command_started = time.perf_counter()
+
+    async def cog_after_invoke(self, ctx: discord.ApplicationContext):
+        started = getattr(ctx, 'command_started', None)
+        if started is not None:
+            COMMAND_SECONDS.observe(time.perf_counter() - started, command=ctx.command.qualified_name)
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        # One persistent view serves the buttons on every queue message
+        if self.queue_view is None:
+            self.queue_view = QueueView(self.get_player)
+            self.bot.add_view(self.queue_view)
+        if not self.reap_idle.is_running():
+            self.reap_idle.start()
+        if WARM_TOP_TRACKS and not self.warm_popular.is_running():
+            self.warm_popular.start()
+
+        # Only guilds that were playing rejoin voice; the rest restore on demand
+        if STATE_STORE:
+            for guild_id in STATE_STORE.playing_guilds():
+                if guild_id not in self.players and self.bot.get_guild(guild_id):
+                    task = asyncio.create_task(self.resume(guild_id))
+                    self.resuming.add(task)
+                    task.add_done_callback(self.resuming.discard)
+
+    async def resume(self, guild_id: int):
+        try:
+            await self.get_player(guild_id).resume()
+        except Exception as e:
+            logger.error(f"Resume failed for guild {guild_id}: {str(e)}")
+
+    def cog_unload(self):
+        self.reap_idle.cancel()
+        self.warm_popular.cancel()
+        for task in list(self.resuming):
+            task.cancel()
+
+    @tasks.loop(seconds=REAP_INTERVAL)
+    async def reap_idle(self):
+        """Evict players that are idle or alone in their voice channel"""
+        now = time.monotonic()
+        for guild_id, player in list(self.players.items()):
+            guild = self.bot.get_guild(guild_id)
+            vc = guild.voice_client if guild else None
+
+            alone = False
+            if vc and vc.is_connected():
+                listeners = [m for m in vc.channel.members if not m.bot]
+                if listeners:
+                    player.alone_since = None
+                    if vc.is_playing() or vc.is_paused():
+                        player.touch()
+                        continue
+                else:
+                    # Track starts count as activity, so time being alone
+                    # separately or a long queue would play to nobody
+                    if player.alone_since is None:
+                        player.alone_since = now
+                    alone = now - player.alone_since >= IDLE_TIMEOUT
+
+            if not alone and now - player.last_active < IDLE_TIMEOUT:
+                continue
+
+            try:
+                await player.shutdown()
+            except Exception as e:
+                logger.error(f"Idle eviction error in guild {guild_id}: {str(e)}")
+            self.players.pop(guild_id, None)
+            if player.text_channel:
+                MESSAGES.discard(player.text_channel.id)
+            logger.info(f"Evicted idle player for guild {guild_id}")
+
+        logger.debug(f"Player gauges: {self.gauges()}")
+
+    @tasks.loop(seconds=WARM_INTERVAL)
+    async def warm_popular(self):
+        """Keep the most played tracks resolved before anyone asks for them"""
+        for info in POPULARITY.top(WARM_TOP_TRACKS):
+            try:
+                # Valid past the next pass, so a request never waits on yt-dlp
+                if await YTDLSource.warm(info['webpage_url'], within=WARM_INTERVAL):
+                    TRACKS_WARMED.inc()
+                if WARM_AUDIO and AUDIO_CACHE:
+                    await AUDIO_CACHE.prefetch(Track.from_info(info))
+            except Exception as e:
+                logger.error(f"Warming {info['title']} failed: {str(e)}")
 
     # Create slash command group
     music = SlashCommandGroup("music", "Music player commands")
@@ -47,28 +247,121 @@ class Music(commands.Cog):
             await ctx.respond(embed=embed)
             return
 
-        # Spotify URL handling
-        if "open.spotify.com" in query:
-            track_info = await self.spotify.get_track_info(query)
-            if not track_info:
-                embed = EmbedGenerator.error("Couldn't fetch Spotify track info")
-                await ctx.respond(embed=embed)
-                return
-            query = f"{track_info['artist']} - {track_info['title']}"
+        # Per-user and per-guild rate limits keep spam out of the resolution queue
+        retry = ADMISSION.throttle(ctx.guild.id, ctx.author.id)
+        if retry:
+            embed = EmbedGenerator.warning(f"Too many requests, try again in {math.ceil(retry)}s")
+            await ctx.respond(embed=embed)
+            return
+
+        # Spotify playlists and albums are resolved incrementally
+        if "open.spotify.com" in query and SpotifyHandler.is_collection(query):
+            await self.play_collection(ctx, player, query)
+            return
 
-        # Process query
-        source = await YTDLSource.create_source(query, loop=self.bot.loop)
+        # YouTube playlists and mixes are listed flat and resolved lazily
+        if YTDLSource.is_playlist(query):
+            await self.play_playlist(ctx, player, query)
+            return
+
+        # Spotify tracks are matched to a YouTube recording (and remembered);
+        # text searches defer the stream until playback
+        spotify = "open.spotify.com" in query
+        text = not spotify and FAST_SEARCH and not URL_RE.match(query)
+        if spotify:
+            cached = SpotifyHandler.is_matched(query)
+        else:
+            cached = RESOLUTION_CACHE.answers(query, stream=not text)
+
+        # Answers already in memory skip the queue; the rest wait their turn
+        async with self.resolution_slot(ctx, bypass=cached):
+            if spotify:
+                source = await self.spotify.resolve_track(query)
+            elif text:
+                source = await YTDLSource.search(query)
+            else:
+                source = await YTDLSource.create_source(query, loop=self.bot.loop)
         if not source:
-            embed = EmbedGenerator.error("No results found")
+            embed = EmbedGenerator.error("Couldn't find that Spotify track" if spotify else "No results found")
             await ctx.respond(embed=embed)
             return
         
         # Add requester information
-        source['requester'] = ctx.author.display_name
-        source['requester_avatar'] = ctx.author.display_avatar.url
+        source.set_requester(ctx.author)
 
         await player.add_to_queue(ctx, source)
 
+    async def play_playlist(self, ctx: discord.ApplicationContext, player: Player, url: str):
+        """Enqueue a whole YouTube playlist from a single flat extraction"""
+        async with self.resolution_slot(ctx):
+            title, tracks = await YTDLSource.create_playlist(url)
+        if not tracks:
+            embed = EmbedGenerator.error("Couldn't load any tracks from that playlist")
+            await ctx.respond(embed=embed)
+            return
+
+        for track in tracks:
+            track.set_requester(ctx.author)
+
+        # Reply before the first track is resolved for playback
+        embed = EmbedGenerator.success(f"Queued {len(tracks)} tracks from {title}")
+        await ctx.respond(embed=embed)
+        await player.add_tracks(ctx, tracks)
+
+    async def play_collection(self, ctx: discord.ApplicationContext, player: Player, url: str):
+        """Resolve a Spotify playlist/album and stream it into the queue
+
+        Lookups run with bounded concurrency but are enqueued in playlist
+        order; playback starts as soon as the first track resolves. Each
+        lookup is a separate job in the fair queue, so a long playlist takes
+        turns with other guilds' requests.
+        """
+        semaphore = asyncio.Semaphore(SPOTIFY_RESOLVE_CONCURRENCY)
+        pending = asyncio.Queue()
+
+        async def resolve(info: dict):
+            async with semaphore, ADMISSION.enqueue(ctx.guild.id):
+                return await self.spotify.match(info)
+
+        async def produce():
+            try:
+                async for info in self.spotify.iter_collection(url):
+                    pending.put_nowait(asyncio.create_task(resolve(info)))
+            except Exception as e:
+                logger.error(f"Spotify collection error: {str(e)}")
+            finally:
+                pending.put_nowait(None)
+
+        producer = asyncio.create_task(produce())
+        added = failed = 0
+        try:
+            while (task := await pending.get()) is not None:
+                source = await task
+                if not source:
+                    failed += 1
+                    continue
+
+                source.set_requester(ctx.author)
+
+                # Announce the first track, queue the rest silently
+                await player.add_to_queue(ctx, source, announce=added == 0)
+                added += 1
+        finally:
+            producer.cancel()
+            while not pending.empty():
+                task = pending.get_nowait()
+                if task:
+                    task.cancel()
+
+        if not added:
+            embed = EmbedGenerator.error("Couldn't resolve any tracks from that Spotify link")
+        else:
+            message = f"Queued {added} tracks from Spotify"
+            if failed:
+                message += f" ({failed} not found)"
+            embed = EmbedGenerator.success(message)
+        await ctx.respond(embed=embed)
+
     @music.command(name="skip", description="Skip the current song")
     async def skip(self, ctx: discord.ApplicationContext):
         player = self.get_player(ctx.guild.id)
@@ -77,9 +370,13 @@ class Music(commands.Cog):
         await ctx.respond(embed=embed)
 
     @music.command(name="queue", description="Show the current queue")
-    async def show_queue(self, ctx: discord.ApplicationContext):
+    async def show_queue(
+        self,
+        ctx: discord.ApplicationContext,
+        page: discord.Option(int, "Page number", min_value=1, default=1)
+    ):
         player = self.get_player(ctx.guild.id)
-        await player.show_queue(ctx)
+        await player.show_queue(ctx, page, view=self.queue_view)
 
     @music.command(name="remove", description="Remove a song from the queue")
     async def remove(
@@ -90,6 +387,49 @@ class Music(commands.Cog):
         player = self.get_player(ctx.guild.id)
         await player.remove(ctx, index)
 
+    @music.command(name="removeuser", description="Remove every queued song from one user")
+    async def remove_user(
+        self,
+        ctx: discord.ApplicationContext,
+        member: discord.Option(discord.Member, "User whose songs to remove")
+    ):
+        player = self.get_player(ctx.guild.id)
+        await player.remove_requester(ctx, member)
+
+    @music.command(name="move", description="Move a song to another position in the queue")
+    async def move(
+        self,
+        ctx: discord.ApplicationContext,
+        position: discord.Option(int, "Position of the song to move", min_value=1),
+        to: discord.Option(int, "New position", min_value=1)
+    ):
+        player = self.get_player(ctx.guild.id)
+        await player.move(ctx, position, to)
+
+    @music.command(name="shuffle", description="Shuffle the queue")
+    async def shuffle(self, ctx: discord.ApplicationContext):
+        player = self.get_player(ctx.guild.id)
+        await player.shuffle(ctx)
+
+    @music.command(name="dedupe", description="Remove duplicate songs from the queue")
+    async def dedupe(self, ctx: discord.ApplicationContext):
+        player = self.get_player(ctx.guild.id)
+        await player.dedupe(ctx)
+
+    @music.command(name="clear", description="Remove every song from the queue")
+    async def clear(self, ctx: discord.ApplicationContext):
+        player = self.get_player(ctx.guild.id)
+        await player.clear(ctx)
+
+    @music.command(name="loop", description="Repeat the current song")
+    async def loop(
+        self,
+        ctx: discord.ApplicationContext,
+        enabled: discord.Option(bool, "Turn looping on or off (toggles if omitted)", default=None)
+    ):
+        player = self.get_player(ctx.guild.id)
+        await player.set_loop(ctx, not player.loop if enabled is None else enabled)
+
     @music.command(name="volume", description="Set player volume (0-100)")
     async def set_volume(
         self, 
@@ -97,14 +437,17 @@ class Music(commands.Cog):
         level: discord.Option(int, "Volume level (0-100)", min_value=0, max_value=100)
     ):
         player = self.get_player(ctx.guild.id)
-        await player.set_volume(ctx, level / 100)
-        embed = EmbedGenerator.success(f"Volume set to {level}%")
+        applied = await player.set_volume(ctx, level / 100)
+        message = f"Volume set to {level}%"
+        if not applied:
+            message += " (takes effect from the next track)"
+        embed = EmbedGenerator.success(message)
         await ctx.respond(embed=embed)
 
     @music.command(name="nowplaying", description="Show current song info")
     async def now_playing(self, ctx: discord.ApplicationContext):
         player = self.get_player(ctx.guild.id)
-        await player.now_playing(ctx)
+        await player.show_now_playing(ctx)
 
     @music.command(name="disconnect", description="Disconnect from voice channel")
     async def disconnect(self, ctx: discord.ApplicationContext):
@@ -0,0 +1,160 @@
+import os
+import time
+import heapq
+import asyncio
+import itertools
+import logging
+from utils.cache import LRUCache
+from utils.metrics import Counter, Gauge, Histogram
+from utils.ratelimit import TokenBucket
+from utils.ytdl import YTDL_POOL
+
+logger = logging.getLogger('hertz')
+
+# Resolution jobs running at once; matching the extraction pool keeps the
+# backlog here, where it is ordered fairly, instead of in the executor
+ADMISSION_SLOTS = int(os.getenv('ADMISSION_SLOTS', str(YTDL_POOL.workers)))
+
+# Play requests allowed per ADMISSION_PERIOD seconds, per user and per guild
+ADMISSION_PERIOD = float(os.getenv('ADMISSION_PERIOD', '30'))
+ADMISSION_USER_RATE = float(os.getenv('ADMISSION_USER_RATE', '6'))
+ADMISSION_GUILD_RATE = float(os.getenv('ADMISSION_GUILD_RATE', '30'))
+
+ADMISSION_REJECTED = Counter(
+    'soundscape_admission_rejected_total', 'Requests refused by a rate limit', ('scope',)
+)
+ADMISSION_WAIT = Histogram(
+    'soundscape_admission_wait_seconds', 'Time resolution jobs waited for a slot'
+)
+
+
+class Ticket:
+    """A queued resolution job; `async with` waits for its slot and frees it"""
+
+    def __init__(self, queue: 'FairQueue', future: asyncio.Future, position: int):
+        self.queue = queue
+        self.future = future
+        self.position = position
+        self.queued = time.perf_counter()
+
+    @property
+    def granted(self) -> bool:
+        return self.future.done() and not self.future.cancelled()
+
+    async def __aenter__(self):
+        try:
+            await self.future
+        except asyncio.CancelledError:
+            # Cancelled just after being granted: hand the slot on
+            if self.granted:
+                self.queue.release()
+            raise
+        ADMISSION_WAIT.observe(time.perf_counter() - self.queued)
+        return self
+
+    async def __aexit__(self, *exc):
+        self.queue.release()
+
+
+class FairQueue:
+    """Start-time fair queuing of jobs across guilds
+
+    Each job is tagged with the later of the current virtual time and the
+    end of its guild's previous job, and the lowest tag runs next. A guild
+    with a long backlog therefore takes turns with the others instead of
+    holding every slot, and a lone request waits at most one round.
+    """
+
+    # Sweep idle guilds out of `finish` past this many entries
+    PRUNE_AT = 4096
+
+    def __init__(self, slots: int):
+        self.slots = slots
+        self.active = 0
+        self.virtual = 0.0
+        self.finish = {}
+        self.prune_at = self.PRUNE_AT
+        self.waiting = []
+        self._order = itertools.count()
+
+    def enqueue(self, guild_id: int, cost: float = 1) -> Ticket:
+        """Queue a job; `cost` is its share of a turn"""
+        start = max(self.virtual, self.finish.get(guild_id, 0.0))
+        self.finish[guild_id] = start + cost
+        if len(self.finish) > self.prune_at:
+            self._prune()
+        entry = (start, next(self._order), guild_id, asyncio.get_running_loop().create_future())
+        heapq.heappush(self.waiting, entry)
+        self._dispatch()
+
+        position = 0
+        if not entry[3].done():
+            position = 1 + sum(1 for other in self.waiting if other < entry)
+        return Ticket(self, entry[3], position)
+
+    def _dispatch(self):
+        while self.active < self.slots and self.waiting:
+            start, _, _, future = heapq.heappop(self.waiting)
+            if future.cancelled():
+                continue
+            self.virtual = start
+            self.active += 1
+            future.set_result(None)
+
+    def _prune(self):
+        # A tag the virtual time has passed is no different from no tag
+        self.finish = {gid: tag for gid, tag in self.finish.items() if tag > self.virtual}
+        self.prune_at = max(self.PRUNE_AT, 2 * len(self.finish))
+
+    def release(self):
+        self.active -= 1
+        self._dispatch()
+
+
+class Admission:
+    """Per-user and per-guild rate limits in front of a FairQueue"""
+
+    def __init__(self, slots: int = ADMISSION_SLOTS, period: float = ADMISSION_PERIOD,
+                 user_rate: float = ADMISSION_USER_RATE, guild_rate: float = ADMISSION_GUILD_RATE):
+        self.queue = FairQueue(slots)
+        self.period = period
+        self.user_rate = user_rate
+        self.guild_rate = guild_rate
+        # A bucket left alone for a whole period is full again, so
+        # expiring it then loses nothing
+        self.users = LRUCache(65536, period)
+        self.guilds = LRUCache(16384, period)
+        Gauge(
+            'soundscape_admission_waiting', 'Resolution jobs waiting for a slot',
+            function=lambda: len(self.queue.waiting)
+        )
+        Gauge(
+            'soundscape_admission_active', 'Resolution jobs holding a slot',
+            function=lambda: self.queue.active
+        )
+
+    def _bucket(self, buckets: LRUCache, key: int, rate: float) -> TokenBucket:
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(rate, self.period)
+        buckets.set(key, bucket)
+        return bucket
+
+    def throttle(self, guild_id: int, user_id: int) -> float:
+        """Take one request from both buckets, or return the seconds until allowed"""
+        user = self._bucket(self.users, user_id, self.user_rate)
+        guild = self._bucket(self.guilds, guild_id, self.guild_rate)
+        user_wait, guild_wait = user.delay(), guild.delay()
+        if user_wait or guild_wait:
+            ADMISSION_REJECTED.inc(scope='user' if user_wait >= guild_wait else 'guild')
+            return max(user_wait, guild_wait)
+        user.try_acquire()
+        guild.try_acquire()
+        return 0.0
+
+    def enqueue(self, guild_id: int, cost: float = 1) -> Ticket:
+        """Queue a resolution job in the guild's share of the slots"""
+        return self.queue.enqueue(guild_id, cost)
+
+
+ADMISSION = Admission()
@@ -0,0 +1,126 @@
+import os
+import glob
+import logging
+from collections import OrderedDict
+from utils.singleflight import SingleFlight
+from utils.metrics import Counter, Gauge
+from utils.track import Track
+from utils.ytdl import YTDL_OPTS, YTDLPool
+
+logger = logging.getLogger('hertz')
+
+# Extensions that always hold Opus audio and can be passed through as-is
+OPUS_EXTS = ('.webm', '.opus')
+
+
+class AudioCache:
+    """On-disk cache of downloaded audio with a size budget and LRU eviction
+
+    Files are named by video id so the cache survives restarts; recency is
+    kept in file mtimes. Downloads run on their own small pool so they never
+    hold up stream resolution.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, workers: int = 2):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.files = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.pool = YTDLPool(workers, name='audio')
+        self.flights = SingleFlight('audio')
+        self.opts = {
+            **YTDL_OPTS,
+            # Prefer Opus so cached files can be streamed without re-encoding
+            'format': 'bestaudio[acodec=opus]/bestaudio/best',
+            'outtmpl': os.path.join(directory, '%(id)s.%(ext)s'),
+        }
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+        Gauge('soundscape_audio_cache_bytes', 'Bytes held by the audio cache', function=lambda: self.size)
+        Counter(
+            'soundscape_audio_cache_lookups_total', 'Audio cache lookups by outcome', ('result',),
+            function=lambda: {('hit',): self.hits, ('miss',): self.misses}
+        )
+
+    def _scan(self):
+        entries = []
+        for path in glob.glob(os.path.join(self.directory, '*')):
+            if path.endswith('.part'):
+                continue
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, path, stat.st_size))
+        for _, path, size in sorted(entries):
+            vid = os.path.splitext(os.path.basename(path))[0]
+            self.files[vid] = (path, size)
+            self.size += size
+        logger.info(f"Audio cache: {len(self.files)} files, {self.size // (1024 * 1024)} MB")
+
+    def path(self, track: Track):
+        """Return the cached file for a track, marking it recently used"""
+        entry = self.files.get(track.id) if track.id else None
+        if entry is None or not os.path.exists(entry[0]):
+            self.misses += 1
+            return None
+        self.files.move_to_end(track.id)
+        try:
+            os.utime(entry[0])
+        except OSError:
+            pass
+        self.hits += 1
+        return entry[0]
+
+    @staticmethod
+    def is_opus(path: str) -> bool:
+        return path.endswith(OPUS_EXTS)
+
+    async def prefetch(self, track: Track):
+        """Download a track into the cache in the background"""
+        if not track.id or track.id in self.files or not track.webpage_url:
+            return
+        try:
+            await self.flights.do(track.id, lambda: self._download(track))
+        except Exception as e:
+            logger.error(f"Audio prefetch failed for {track.title}: {str(e)}")
+
+    async def _download(self, track: Track):
+        info = await self.pool.extract(track.webpage_url, opts=self.opts, download=True)
+        downloads = info.get('requested_downloads') or []
+        path = downloads[0].get('filepath') if downloads else None
+        if not path:
+            matches = glob.glob(os.path.join(glob.escape(self.directory), f"{glob.escape(track.id)}.*"))
+            path = matches[0] if matches else None
+        if not path or not os.path.exists(path):
+            return
+        size = os.path.getsize(path)
+        self.files[track.id] = (path, size)
+        self.size += size
+        self._evict()
+
+    def _evict(self):
+        while self.size > self.max_bytes and len(self.files) > 1:
+            vid, (path, size) = self.files.popitem(last=False)
+            self.size -= size
+            try:
+                # Files still being played stay readable until FFmpeg closes them
+                os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        return {
+            'files': len(self.files),
+            'bytes': self.size,
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+
+AUDIO_CACHE_DIR = os.getenv('AUDIO_CACHE_DIR')
+AUDIO_CACHE = AudioCache(
+    AUDIO_CACHE_DIR,
+    int(os.getenv('AUDIO_CACHE_MAX_MB', '2048')) * 1024 * 1024,
+    int(os.getenv('AUDIO_DOWNLOAD_WORKERS', '2'))
+) if AUDIO_CACHE_DIR else None
@@ -1,27 +1,183 @@
+import os
+import time
+import asyncio
 import aiohttp
 import json
 import logging
 import discord  # Import discord module
+from utils.cache import LRUCache
+from utils.singleflight import SingleFlight
+from utils.metrics import Counter, Histogram
+from utils.popularity import POPULARITY
 
 logger = logging.getLogger('hertz')
 
+SUGGEST_URL = os.getenv('SUGGEST_URL', "https://duckduckgo.com/ac/")
+# Discord drops autocomplete responses after 3 seconds
+SUGGEST_TIMEOUT = float(os.getenv('SUGGEST_TIMEOUT', '1.5'))
+SUGGEST_DEBOUNCE = float(os.getenv('SUGGEST_DEBOUNCE', '0.15'))
+MAX_SUGGESTIONS = 5
+
+SUGGEST_SECONDS = Histogram(
+    'soundscape_autocomplete_seconds', 'Autocomplete response time', ('source',),
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 1.5, 2, 3)
+)
+
+
+class SuggestionClient:
+    """Pooled, cached and coalesced search suggestion lookups
+
+    One keep-alive session is shared by every autocomplete event. Results
+    are cached per query, and a longer query is answered from a cached
+    shorter prefix when that prefix's results still cover it. Concurrent
+    lookups of the same query share one request.
+    """
+
+    def __init__(self, maxsize: int = 2048, ttl: float = 900):
+        self.session = None
+        self.cache = LRUCache(maxsize, ttl)
+        self.flights = SingleFlight('suggestions')
+        self.latest = {}
+        self.requests = 0
+        self.cache_hits = 0
+        self.prefix_hits = 0
+        self.local_hits = 0
+        Counter(
+            'soundscape_autocomplete_lookups_total', 'Autocomplete lookups by how they were served',
+            ('result',), function=lambda: {
+                ('request',): self.requests,
+                ('cache',): self.cache_hits,
+                ('prefix',): self.prefix_hits,
+                ('local',): self.local_hits,
+                ('coalesced',): self.flights.coalesced
+            }
+        )
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=SUGGEST_TIMEOUT),
+                connector=aiohttp.TCPConnector(limit=32, ttl_dns_cache=300)
+            )
+        return self.session
+
+    def _from_cache(self, query: str):
+        cached = self.cache.get(query)
+        if cached is not None:
+            self.cache_hits += 1
+            return cached[:MAX_SUGGESTIONS]
+
+        # Walk back through shorter prefixes ("daft p" -> "daft")
+        for end in range(len(query) - 1, 0, -1):
+            cached = self.cache.get(query[:end])
+            if cached is None:
+                continue
+            matches = [s for s in cached if s.lower().startswith(query)]
+            # A short result list was exhaustive, so its filtered
+            # subset is exact; otherwise only trust a full page
+            if len(cached) < MAX_SUGGESTIONS or len(matches) >= MAX_SUGGESTIONS:
+                self.prefix_hits += 1
+                return matches[:MAX_SUGGESTIONS]
+            return None
+        return None
+
+    @staticmethod
+    def _parse(data) -> list:
+        # OpenSearch format: [query, [suggestion, ...]]
+        if len(data) > 1 and isinstance(data[1], list):
+            data = data[1]
+        elif data and isinstance(data[0], list):
+            data = data[0]
+        return [s['phrase'] if isinstance(s, dict) else s for s in data]
+
+    async def _fetch(self, query: str) -> list:
+        self.requests += 1
+        params = {"q": query, "type": "list"}
+        async with self._get_session().get(SUGGEST_URL, params=params) as response:
+            if response.status != 200:
+                return []
+            data = json.loads(await response.text())
+        suggestions = self._parse(data)
+        self.cache.set(query, suggestions)
+        return suggestions
+
+    @staticmethod
+    def _local(query: str) -> list:
+        # Tracks already played here point straight at their video
+        return [
+            discord.OptionChoice(
+                name=(f"{info['artist']} - {info['title']}" if info['artist'] else info['title'])[:100],
+                value=info['webpage_url']
+            )
+            for info in POPULARITY.suggest(query, MAX_SUGGESTIONS)
+            if info['webpage_url'] and len(info['webpage_url']) <= 100
+        ]
+
+    @staticmethod
+    def _merge(local: list, remote: list) -> list:
+        seen = {choice.name.lower() for choice in local}
+        merged = local + [s for s in remote if s.lower() not in seen]
+        return merged[:MAX_SUGGESTIONS]
+
+    async def suggest(self, query: str, user_id: int = None) -> list:
+        """Return up to MAX_SUGGESTIONS suggestions for a query
+
+        Popular tracks matching the query come first; the suggestion API
+        is only asked when they do not fill the list.
+        """
+        query = ' '.join(query.lower().split())
+        if not query:
+            return []
+
+        start = time.perf_counter()
+        local = self._local(query)
+        if len(local) >= MAX_SUGGESTIONS:
+            self.local_hits += 1
+            SUGGEST_SECONDS.observe(time.perf_counter() - start, source='local')
+            return local
+
+        cached = self._from_cache(query)
+        if cached is not None:
+            SUGGEST_SECONDS.observe(time.perf_counter() - start, source='cache')
+            return self._merge(local, cached)
+
+        # Debounce: only the newest keystroke per user goes to the network
+        if user_id is not None:
+            seq = self.latest.get(user_id, 0) + 1
+            self.latest[user_id] = seq
+            await asyncio.sleep(SUGGEST_DEBOUNCE)
+            if self.latest.get(user_id) != seq:
+                return []
+            del self.latest[user_id]
+
+        suggestions = await self.flights.do(query, lambda: self._fetch(query))
+        SUGGEST_SECONDS.observe(time.perf_counter() - start, source='remote')
+        return self._merge(local, suggestions)
+
+    def stats(self) -> dict:
+        return {
+            'requests': self.requests,
+            'cache_hits': self.cache_hits,
+            'prefix_hits': self.prefix_hits,
+            'local_hits': self.local_hits,
+            'coalesced': self.flights.coalesced,
+            'cached': len(self.cache)
+        }
+
+    async def close(self):
+        if self.session and not self.session.closed:
+            await self.session.close()
+
+
 async def get_search_suggestions(ctx: discord.AutocompleteContext):
     """Get YouTube search suggestions using DuckDuckGo API"""
     query = ctx.value
     
     if not query or query.startswith('http'):
         return []
-    
-    url = "https://duckduckgo.com/ac/"
-    params = {"q": query, "type": "list"}
-    
+
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, params=params) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    # Return top 5 suggestions
-                    return data[0][:5]
+        return await ctx.bot.suggestions.suggest(query, user_id=ctx.interaction.user.id)
     except Exception as e:
         logger.error(f"Autocomplete error: {str(e)}")
-    return []
\ No newline at end of file
+    return []
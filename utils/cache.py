@@ -0,0 +1,311 @@
+import os
+import re
+import json
+import time
+import asyncio
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from urllib.parse import urlparse, parse_qs
+
+logger = logging.getLogger('hertz')
+
+# Signed googlevideo URLs carry their expiry either as a query
+# parameter (?expire=...) or as a path segment (/expire/.../)
+_EXPIRE_PATH = re.compile(r'/expire/(\d+)')
+_VIDEO_ID = re.compile(
+    r'(?:youtube\.com/(?:watch\?(?:.*&)?v=|shorts/|embed/|live/)|youtu\.be/)([\w-]{11})'
+)
+
+
+def stream_expiry(url: str) -> float:
+    """Return the unix timestamp a signed stream URL expires at, or 0 if unknown"""
+    if not url:
+        return 0
+    try:
+        expire = parse_qs(urlparse(url).query).get('expire')
+        if expire:
+            return float(expire[0])
+        match = _EXPIRE_PATH.search(url)
+        if match:
+            return float(match.group(1))
+    except ValueError:
+        pass
+    return 0
+
+
+def video_id(url: str) -> str:
+    """Extract the YouTube video id from a URL, or return an empty string"""
+    match = _VIDEO_ID.search(url or '')
+    return match.group(1) if match else ''
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a query or URL into a cache key"""
+    query = query.strip()
+    if re.match(r'https?://', query):
+        vid = video_id(query)
+        return f"id:{vid}" if vid else f"url:{query}"
+    return "q:" + ' '.join(query.lower().split())
+
+
+class LRUCache:
+    """Bounded in-memory LRU cache with per-entry expiry"""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires = entry
+            if expires and expires < time.time():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: float = None):
+        ttl = self.ttl if ttl is None else ttl
+        expires = time.time() + ttl if ttl else 0
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return entry[0] if entry else default
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class WriteBuffer:
+    """Database writes batched off the event loop
+
+    `add` only appends to a list; the rows buffered after `interval`
+    seconds are handed to `write` together, in a worker thread. Without a
+    running event loop they are written straight away.
+    """
+
+    def __init__(self, write, interval: float = 1.0):
+        self.write = write
+        self.interval = interval
+        self.pending = []
+        self.flush_task = None
+
+    def add(self, row):
+        self.pending.append(row)
+        if self.flush_task is None or self.flush_task.done():
+            try:
+                self.flush_task = asyncio.get_running_loop().create_task(self._flush_later())
+            except RuntimeError:
+                self.flush_sync()
+
+    async def _flush_later(self):
+        # Rows added while a write is in flight go out with the next one
+        while self.pending:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    async def flush(self):
+        rows, self.pending = self.pending, []
+        if rows:
+            await asyncio.to_thread(self.write, rows)
+
+    def flush_sync(self):
+        rows, self.pending = self.pending, []
+        if rows:
+            self.write(rows)
+
+
+class ResolutionCache:
+    """Two-tier cache of yt-dlp resolutions
+
+    Metadata is kept for `metadata_ttl` seconds; the signed stream URL
+    is only served until it expires (or `stream_ttl`, whichever is
+    sooner). Entries are stored once per video id and reachable through
+    the normalized query, the video id and the webpage URL. When `db_path`
+    is set, metadata is also persisted to SQLite so it survives restarts;
+    the database is only read and written from worker threads.
+    """
+
+    # Stream URLs expiring within this many seconds are treated as stale
+    STREAM_MARGIN = 300
+
+    def __init__(self, maxsize: int = 2048, metadata_ttl: float = 7 * 86400,
+                 stream_ttl: float = 5 * 3600, db_path: str = None, flush_interval: float = 1.0):
+        self.metadata_ttl = metadata_ttl
+        self.stream_ttl = stream_ttl
+        self.entries = LRUCache(maxsize, metadata_ttl)
+        self.aliases = LRUCache(maxsize * 4, metadata_ttl)
+        self.hits = 0
+        self.stale = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self._db = None
+        self._db_lock = threading.Lock()
+        self.writes = WriteBuffer(self._disk_write, flush_interval)
+        if db_path:
+            self._open_db(db_path)
+
+    def _open_db(self, path: str):
+        try:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS resolutions ("
+                "id TEXT PRIMARY KEY, info TEXT NOT NULL, stored REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS aliases ("
+                "key TEXT PRIMARY KEY, id TEXT NOT NULL)"
+            )
+            self._db.commit()
+            logger.info(f"Resolution cache persisted to {path}")
+        except sqlite3.Error as e:
+            logger.error(f"Resolution cache disabled disk tier: {str(e)}")
+            self._db = None
+
+    def _disk_get(self, key: str):
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT r.id, r.info, r.stored FROM aliases a "
+                "JOIN resolutions r ON r.id = a.id WHERE a.key = ?",
+                (key,)
+            ).fetchone()
+        if not row or row[2] + self.metadata_ttl < time.time():
+            return None
+        return row[0], json.loads(row[1])
+
+    def _disk_write(self, rows: list):
+        """Write buffered (vid, meta, keys, stored) rows in one transaction"""
+        with self._db_lock:
+            try:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO resolutions (id, info, stored) VALUES (?, ?, ?)",
+                    [(vid, json.dumps(meta), stored) for vid, meta, _, stored in rows]
+                )
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO aliases (key, id) VALUES (?, ?)",
+                    [(key, vid) for vid, _, keys, _ in rows for key in keys]
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                self._db.rollback()
+                logger.error(f"Resolution cache write failed: {str(e)}")
+
+    def _stream_fresh(self, entry: dict) -> bool:
+        if not entry['info'].get('url'):
+            return False
+        return entry['url_expires'] - self.STREAM_MARGIN > time.time()
+
+    async def get(self, query: str):
+        """Look up a query or URL
+
+        Returns a copy of the cached info; the 'url' key is dropped when
+        the stream URL has expired so callers know to refresh it.
+        """
+        key = normalize_query(query)
+        vid = self.aliases.get(key)
+        entry = self.entries.get(vid) if vid else None
+
+        if entry is None and self._db is not None:
+            try:
+                found = await asyncio.to_thread(self._disk_get, key)
+            except sqlite3.Error as e:
+                logger.error(f"Resolution cache read failed: {str(e)}")
+                found = None
+            if found:
+                vid, meta = found
+                entry = {'info': meta, 'url_expires': 0}
+                self.entries.set(vid, entry)
+                self.aliases.set(key, vid)
+                self.disk_hits += 1
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        info = dict(entry['info'])
+        if self._stream_fresh(entry):
+            self.hits += 1
+        else:
+            self.stale += 1
+            info.pop('url', None)
+            info.pop('expires', None)
+        return info
+
+    def answers(self, query: str, stream: bool = True) -> bool:
+        """Whether a query is cached in memory (with a fresh stream URL if `stream`), without counting a lookup"""
+        vid = self.aliases.get(normalize_query(query))
+        entry = self.entries.get(vid) if vid else None
+        return entry is not None and (not stream or self._stream_fresh(entry))
+
+    def stream_expires(self, query: str) -> float:
+        """When the cached stream URL for a query expires (0 if none), without counting a lookup"""
+        vid = self.aliases.get(normalize_query(query))
+        entry = self.entries.get(vid) if vid else None
+        if entry is None or not entry['info'].get('url'):
+            return 0
+        return entry['url_expires']
+
+    def put(self, query: str, info: dict):
+        """Store a resolution under its query, video id and webpage URL"""
+        vid = info.get('id') or video_id(info.get('webpage_url', ''))
+        if not vid:
+            return
+
+        # Flat metadata only adds aliases to an existing full resolution
+        if info.get('url') or self.entries.get(vid) is None:
+            expiry = stream_expiry(info.get('url', ''))
+            cap = time.time() + self.stream_ttl
+            self.entries.set(vid, {
+                'info': dict(info),
+                'url_expires': min(expiry, cap) if expiry else cap
+            })
+
+        keys = {normalize_query(query), f"id:{vid}"}
+        if info.get('webpage_url'):
+            keys.add(normalize_query(info['webpage_url']))
+        for key in keys:
+            self.aliases.set(key, vid)
+
+        if self._db is not None:
+            # Stream URLs are short lived; only metadata goes to disk
+            meta = {k: v for k, v in info.items() if k not in ('url', 'expires')}
+            self.writes.add((vid, meta, list(keys), time.time()))
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.stale + self.misses
+        return {
+            'entries': len(self.entries),
+            'hits': self.hits,
+            'stale': self.stale,
+            'misses': self.misses,
+            'disk_hits': self.disk_hits,
+            'hit_rate': (self.hits + self.stale) / lookups if lookups else 0.0
+        }
+
+
+RESOLUTION_CACHE = ResolutionCache(
+    maxsize=int(os.getenv('YTDL_CACHE_SIZE', '2048')),
+    metadata_ttl=float(os.getenv('YTDL_CACHE_TTL', str(7 * 86400))),
+    stream_ttl=float(os.getenv('YTDL_STREAM_TTL', str(5 * 3600))),
+    db_path=os.getenv('YTDL_CACHE_DB') or None,
+    flush_interval=float(os.getenv('YTDL_CACHE_FLUSH_INTERVAL', '1.0'))
+)
@@ -1,4 +1,9 @@
+import re
 import discord
+from utils.track import Track
+
+# Tracks shown per queue page
+QUEUE_PAGE_SIZE = 10
 
 class EmbedGenerator:
     # Muse-inspired color palette
@@ -22,43 +27,44 @@ class EmbedGenerator:
         "loop": "🔁",
         "disconnect": "👋",
         "error": "❌",
-        "success": "✅"
+        "success": "✅",
+        "wait": "⏳"
     }
 
     @staticmethod
-    def now_playing(track: dict) -> discord.Embed:
+    def now_playing(track: Track) -> discord.Embed:
         """Now playing embed in Muse style"""
         embed = discord.Embed(
             title=f"{EmbedGenerator.ICONS['play']} Now Playing",
-            color=EmbedGenerator.COLORS["spotify" if track.get('is_spotify') else "youtube"]
+            color=EmbedGenerator.COLORS["spotify" if track.is_spotify else "youtube"]
         )
         embed.add_field(
             name="Track", 
-            value=f"[{track['title']}]({track['webpage_url']})", 
+            value=f"[{track.title}]({track.webpage_url})", 
             inline=False
         )
         
-        if track.get('artist'):
-            embed.add_field(name="Artist", value=track['artist'], inline=True)
+        if track.artist:
+            embed.add_field(name="Artist", value=track.artist, inline=True)
             
-        if track.get('album'):
-            embed.add_field(name="Album", value=track['album'], inline=True)
+        if track.album:
+            embed.add_field(name="Album", value=track.album, inline=True)
             
-        if track.get('duration'):
-            mins, secs = divmod(track['duration'], 60)
+        if track.duration:
+            mins, secs = divmod(track.duration, 60)
             embed.add_field(name="Duration", value=f"{mins}:{secs:02d}", inline=True)
             
-        if track.get('thumbnail'):
-            embed.set_thumbnail(url=track['thumbnail'])
+        if track.thumbnail:
+            embed.set_thumbnail(url=track.thumbnail)
             
         embed.set_footer(
-            text="Requested by: " + track.get('requester', 'Unknown'),
-            icon_url=track.get('requester_avatar')
+            text="Requested by: " + (track.requester or 'Unknown'),
+            icon_url=track.requester_avatar
         )
         return embed
 
     @staticmethod
-    def added_to_queue(track: dict, position: int) -> discord.Embed:
+    def added_to_queue(track: Track, position: int) -> discord.Embed:
         """Added to queue embed in Muse style"""
         embed = discord.Embed(
             title=f"{EmbedGenerator.ICONS['queue']} Added to Queue",
@@ -67,26 +73,31 @@ class EmbedGenerator:
         )
         embed.add_field(
             name="Track", 
-            value=f"[{track['title']}]({track['webpage_url']})", 
+            value=f"[{track.title}]({track.webpage_url})", 
             inline=False
         )
         
-        if track.get('duration'):
-            mins, secs = divmod(track['duration'], 60)
+        if track.duration:
+            mins, secs = divmod(track.duration, 60)
             embed.add_field(name="Duration", value=f"{mins}:{secs:02d}", inline=True)
             
-        if track.get('thumbnail'):
-            embed.set_thumbnail(url=track['thumbnail'])
+        if track.thumbnail:
+            embed.set_thumbnail(url=track.thumbnail)
             
         embed.set_footer(
-            text="Requested by: " + track.get('requester', 'Unknown'),
-            icon_url=track.get('requester_avatar')
+            text="Requested by: " + (track.requester or 'Unknown'),
+            icon_url=track.requester_avatar
         )
         return embed
 
     @staticmethod
-    def queue_list(queue: list, current: dict, page: int, total_pages: int) -> discord.Embed:
-        """Queue list embed in Muse style"""
+    def queue_list(tracks: list, current: Track, page: int, total_pages: int,
+                   total_tracks: int, total_duration: int, start: int = 0) -> discord.Embed:
+        """Queue list embed in Muse style
+
+        `tracks` is only the page being shown, starting at queue position
+        `start`; totals come from the queue's running counters.
+        """
         embed = discord.Embed(
             title=f"{EmbedGenerator.ICONS['queue']} Current Queue",
             description=f"Page {page}/{total_pages}",
@@ -97,19 +108,17 @@ class EmbedGenerator:
         if current:
             embed.add_field(
                 name=f"{EmbedGenerator.ICONS['play']} Now Playing",
-                value=f"[{current['title']}]({current['webpage_url']})",
+                value=f"[{current.title}]({current.webpage_url})",
                 inline=False
             )
         
         # Queue items
-        if queue:
+        if tracks:
             queue_text = ""
-            for idx, track in enumerate(queue):
-                if idx >= 10:  # Only show 10 per page
-                    break
-                mins, secs = divmod(track.get('duration', 0), 60)
-                duration = f"{mins}:{secs:02d}" if track.get('duration') else "N/A"
-                queue_text += f"`{idx+1}.` [{track['title']}]({track['webpage_url']}) `{duration}`\n"
+            for idx, track in enumerate(tracks, start=start + 1):
+                mins, secs = divmod(track.duration, 60)
+                duration = f"{mins}:{secs:02d}" if track.duration else "N/A"
+                queue_text += f"`{idx}.` [{track.title}]({track.webpage_url}) `{duration}`\n"
             
             embed.add_field(
                 name="Up Next",
@@ -124,18 +133,23 @@ class EmbedGenerator:
             )
             
         # Queue metadata
-        total_duration = sum(t.get('duration', 0) for t in queue)
         total_mins, total_secs = divmod(total_duration, 60)
         total_hours, total_mins = divmod(total_mins, 60)
         
         embed.add_field(
             name="Queue Info",
-            value=f"Tracks: {len(queue)}\nDuration: "
+            value=f"Tracks: {total_tracks}\nDuration: "
                   f"{f'{total_hours}h ' if total_hours else ''}{total_mins}m {total_secs}s",
             inline=False
         )
         return embed
 
+    @staticmethod
+    def queue_page_of(embed: discord.Embed) -> int:
+        """Read the page number back from a queue_list embed"""
+        match = re.match(r'Page (\d+)/', embed.description or '')
+        return int(match.group(1)) if match else 1
+
     @staticmethod
     def error(message: str) -> discord.Embed:
         """Error embed in Muse style"""
@@ -146,6 +160,16 @@ class EmbedGenerator:
         )
         return embed
 
+    @staticmethod
+    def warning(message: str) -> discord.Embed:
+        """Busy/slow down embed in Muse style"""
+        embed = discord.Embed(
+            title=f"{EmbedGenerator.ICONS['wait']} Hold on",
+            description=message,
+            color=EmbedGenerator.COLORS["warning"]
+        )
+        return embed
+
     @staticmethod
     def success(message: str) -> discord.Embed:
         """Success embed in Muse style"""
@@ -0,0 +1,103 @@
+import os
+import asyncio
+import logging
+import discord
+from utils.ratelimit import TokenBucket
+from utils.metrics import Counter
+
+logger = logging.getLogger('hertz')
+
+# Discord allows about 5 messages per 5 seconds in a channel; stay inside it
+CHANNEL_RATE = float(os.getenv('CHANNEL_MESSAGE_RATE', '5'))
+CHANNEL_PERIOD = float(os.getenv('CHANNEL_MESSAGE_PERIOD', '5'))
+# Seconds to collect a burst of updates before the first REST call
+BATCH_WINDOW = float(os.getenv('CHANNEL_BATCH_WINDOW', '0.25'))
+# Embeds Discord accepts in one message
+MAX_EMBEDS = 10
+
+CHANNEL_MESSAGES = Counter(
+    'soundscape_channel_messages_total', 'Channel message updates by outcome', ('kind',)
+)
+
+
+class ChannelMessenger:
+    """Outbound messages for one text channel
+
+    Now-playing updates edit a single message and only the latest pending
+    update is sent. Notices queued in the same window go out together as
+    one message with several embeds. Every REST call takes a token from the
+    channel's bucket first, so bursts queue locally instead of hitting 429s.
+    """
+
+    def __init__(self, channel: discord.abc.Messageable):
+        self.channel = channel
+        self.bucket = TokenBucket(CHANNEL_RATE, CHANNEL_PERIOD)
+        self.notices = []
+        self.pending_now_playing = None
+        self.now_playing_message = None
+        self.task = None
+
+    def notice(self, embed: discord.Embed):
+        self.notices.append(embed)
+        self._wake()
+
+    def now_playing(self, embed: discord.Embed):
+        if self.pending_now_playing is not None:
+            CHANNEL_MESSAGES.inc(kind='coalesced')
+        self.pending_now_playing = embed
+        self._wake()
+
+    def _wake(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self._drain())
+
+    async def _drain(self):
+        await asyncio.sleep(BATCH_WINDOW)
+        while self.notices or self.pending_now_playing is not None:
+            await self.bucket.acquire()
+            try:
+                if self.notices:
+                    embeds = self.notices[:MAX_EMBEDS]
+                    del self.notices[:MAX_EMBEDS]
+                    CHANNEL_MESSAGES.inc(len(embeds) - 1, kind='merged')
+                    await self.channel.send(embeds=embeds)
+                    CHANNEL_MESSAGES.inc(kind='send')
+                else:
+                    embed, self.pending_now_playing = self.pending_now_playing, None
+                    await self._show_now_playing(embed)
+            except discord.HTTPException as e:
+                logger.error(f"Couldn't post to channel {self.channel.id}: {str(e)}")
+
+    async def _show_now_playing(self, embed: discord.Embed):
+        # Edit in place while the message is still the latest in the channel
+        message = self.now_playing_message
+        if message and getattr(self.channel, 'last_message_id', None) in (None, message.id):
+            try:
+                await message.edit(embed=embed)
+                CHANNEL_MESSAGES.inc(kind='edit')
+                return
+            except discord.NotFound:
+                pass
+        self.now_playing_message = await self.channel.send(embed=embed)
+        CHANNEL_MESSAGES.inc(kind='send')
+
+
+class MessageCoordinator:
+    """One ChannelMessenger per text channel"""
+
+    def __init__(self):
+        self.channels = {}
+
+    def channel(self, channel: discord.abc.Messageable) -> ChannelMessenger:
+        messenger = self.channels.get(channel.id)
+        if messenger is None:
+            messenger = self.channels[channel.id] = ChannelMessenger(channel)
+        return messenger
+
+    def discard(self, channel_id: int):
+        messenger = self.channels.pop(channel_id, None)
+        if messenger and messenger.task:
+            messenger.task.cancel()
+
+
+MESSAGES = MessageCoordinator()
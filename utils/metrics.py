@@ -0,0 +1,264 @@
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+from collections import Counter as Tally
+from aiohttp import web
+
+logger = logging.getLogger('hertz')
+
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+# Seconds between event loop lag samples
+LAG_INTERVAL = float(os.getenv('METRICS_LAG_INTERVAL', '0.5'))
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra: str = '') -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Metric:
+    """Base for labelled metrics rendered in Prometheus text format
+
+    A metric either records values pushed to it or, when `function` is
+    given, reads them at scrape time. The function returns a number, or
+    a dict mapping label value tuples to numbers.
+    """
+
+    kind = 'untyped'
+
+    def __init__(self, name: str, help: str, labels=(), function=None, registry=None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self.function = function
+        self.values = {}
+        self._lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(n, '')) for n in self.labelnames)
+
+    def samples(self):
+        if self.function is None:
+            with self._lock:
+                return list(self.values.items())
+        try:
+            result = self.function()
+        except Exception as e:
+            logger.error(f"Metric {self.name} collection failed: {str(e)}")
+            return []
+        if isinstance(result, dict):
+            return [(tuple(str(v) for v in key), value) for key, value in result.items()]
+        return [((), result)]
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in self.samples():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self.values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labels=(), buckets=DEFAULT_BUCKETS, registry=None):
+        super().__init__(name, help, labels, registry=registry)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def time(self, **labels) -> _Timer:
+        """Context manager observing the duration of its block"""
+        return _Timer(self, labels)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(key, (list(b), s, c)) for key, (b, s, c) in self.values.items()]
+        for key, (buckets, total, count) in items:
+            for bound, cumulative in zip(self.buckets, buckets):
+                labels = _format_labels(self.labelnames, key, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric: Metric):
+        self.metrics[metric.name] = metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+EVENT_LOOP_LAG = Histogram(
+    'soundscape_event_loop_lag_seconds', 'Delay of the event loop waking a periodic task',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+
+
+async def monitor_loop_lag(interval: float = LAG_INTERVAL):
+    """Record how late the event loop wakes a periodic sleeper"""
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(0.0, time.perf_counter() - start - interval))
+
+
+def sample_stacks(thread_id: int, seconds: float, interval: float = 0.005) -> str:
+    """Sample one thread's stack and return it in collapsed (flamegraph) format"""
+    stacks = Tally()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        frame = sys._current_frames().get(thread_id)
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+            frame = frame.f_back
+        if stack:
+            stacks[';'.join(reversed(stack))] += 1
+        time.sleep(interval)
+    return '\n'.join(f"{stack} {count}" for stack, count in stacks.most_common()) + '\n'
+
+
+class StartupTimer:
+    """Time each startup phase and export the durations as gauges"""
+
+    def __init__(self, started: float = None):
+        self.started = self.last = started or time.perf_counter()
+        self.phases = {}
+        self.time_to_ready = None
+        Gauge(
+            'soundscape_startup_phase_seconds', 'Seconds spent in each startup phase', ('phase',),
+            function=lambda: {(phase,): seconds for phase, seconds in self.phases.items()}
+        )
+        Gauge(
+            'soundscape_time_to_ready_seconds', 'Seconds from launch until the bot was ready',
+            function=lambda: self.time_to_ready or 0
+        )
+
+    def mark(self, phase: str):
+        """Record the phase that just finished"""
+        now = time.perf_counter()
+        self.phases[phase] = round(now - self.last, 4)
+        self.last = now
+        logger.info(f"Startup: {phase} took {self.phases[phase]:.3f}s ({now - self.started:.3f}s since launch)")
+
+    def ready(self):
+        self.mark('ready')
+        self.time_to_ready = round(self.last - self.started, 4)
+
+
+class MetricsServer:
+    """Local HTTP endpoint serving /metrics and, if enabled, /debug/profile"""
+
+    def __init__(self, port: int, host: str = METRICS_HOST, profiler: bool = False):
+        self.port = port
+        self.host = host
+        self.profiler = profiler
+        self.runner = None
+        self.lag_task = None
+        self.loop_thread = None
+        self.profiling = asyncio.Lock()
+
+    async def metrics(self, request: web.Request) -> web.Response:
+        return web.Response(text=REGISTRY.render(), content_type='text/plain', charset='utf-8')
+
+    async def profile(self, request: web.Request) -> web.Response:
+        seconds = min(float(request.query.get('seconds', '10')), 60)
+        if self.profiling.locked():
+            return web.Response(status=409, text="A profile is already running\n")
+        async with self.profiling:
+            # Sample from a worker thread so the loop itself is what we see
+            text = await asyncio.to_thread(sample_stacks, self.loop_thread, seconds)
+        return web.Response(text=text, content_type='text/plain', charset='utf-8')
+
+    async def start(self):
+        self.loop_thread = threading.get_ident()
+        app = web.Application()
+        app.router.add_get('/metrics', self.metrics)
+        if self.profiler:
+            app.router.add_get('/debug/profile', self.profile)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        self.lag_task = asyncio.create_task(monitor_loop_lag())
+        logger.info(f"Metrics listening on http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self.lag_task:
+            self.lag_task.cancel()
+        if self.runner:
+            await self.runner.cleanup()
@@ -1,108 +1,449 @@
+import os
+import time
 import discord
 import asyncio
 import logging
-from collections import deque
-from utils.embed import EmbedGenerator
+from utils.embed import EmbedGenerator, QUEUE_PAGE_SIZE
+from utils.track import Track, TrackQueue
+from utils.ytdl import YTDLSource
+from utils.audiocache import AUDIO_CACHE
+from utils.metrics import Counter
+from utils.state import STATE_STORE, track_state
+from utils.messages import MESSAGES
+from utils.popularity import POPULARITY
+from utils.admission import ADMISSION
 
 logger = logging.getLogger('hertz')
 
+# Seconds before the current track ends to re-resolve the next one
+PREFETCH_LEAD = float(os.getenv('PREFETCH_LEAD', '30'))
+# Queued tracks to pre-download when the audio cache is enabled
+AUDIO_PREFETCH_DEPTH = int(os.getenv('AUDIO_PREFETCH_DEPTH', '2'))
+
+TRACKS_STARTED = Counter('soundscape_tracks_started_total', 'Tracks that started playing')
+PLAYBACK_ERRORS = Counter(
+    'soundscape_playback_errors_total', 'Tracks that failed to start', ('stage',)
+)
+
+# Attempts per track before it is skipped, and tracks in a row that may
+# fail before playback stops
+PLAYBACK_ATTEMPTS = int(os.getenv('PLAYBACK_ATTEMPTS', '2'))
+FAILURE_BUDGET = int(os.getenv('PLAYBACK_FAILURE_BUDGET', '5'))
+# Seconds before the first retry; doubles with each further attempt
+RETRY_BACKOFF = float(os.getenv('PLAYBACK_RETRY_BACKOFF', '1.0'))
+
+FFMPEG_BEFORE_OPTS = "-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5"
+
+# Playback states
+IDLE, STARTING, PLAYING = 'idle', 'starting', 'playing'
+
+
+class PlaybackError(Exception):
+    """A track failed to start at `stage` (resolve, connect or play)"""
+
+    def __init__(self, stage: str, message: str):
+        super().__init__(message)
+        self.stage = stage
+
+
 class Player:
-    def __init__(self, bot: discord.Bot):
+    def __init__(self, bot: discord.Bot, guild_id: int):
         self.bot = bot
-        self.queue = deque()
+        self.guild_id = guild_id
+        self.queue = TrackQueue()
+        self.text_channel = None
+        self.voice_channel_id = None
         self.current = None
         self.volume = 0.5
         self.loop = False
         self.now_playing = None
-        logger.info(f"Player initialized for guild")
+        self.started_at = 0.0
+        self.offset = 0.0
+        self.prefetch_task = None
+        self.downloads = set()
+        self.state = IDLE
+        self.events = asyncio.Queue()
+        self.consumer = None
+        self.generation = 0
+        self.page_cache = {}
+        self.page_cache_key = None
+        self.last_active = time.monotonic()
+        self.alone_since = None
+        self.store = STATE_STORE
+        if self.store:
+            self.queue.journal = self._journal
+        logger.info(f"Player initialized for guild {guild_id}")
 
-    async def add_to_queue(self, ctx: discord.ApplicationContext, source: dict):
+    @property
+    def guild(self) -> discord.Guild:
+        return self.bot.get_guild(self.guild_id)
+
+    def _journal(self, op: str, *args):
+        if op == 'snapshot':
+            # Bulk operations replace the journal instead of growing it
+            self.store.snapshot(self.guild_id, args[0])
+            return
+        self.store.record(self.guild_id, op, *args)
+        if self.store.needs_compaction(self.guild_id):
+            self.store.snapshot(self.guild_id, self.queue)
+
+    def save_state(self):
+        """Checkpoint settings and playback status (batched by the store)"""
+        if not self.store:
+            return
+        self.store.update_player(
+            self.guild_id,
+            volume=self.volume,
+            loop=self.loop,
+            playing=self.current is not None,
+            current=track_state(self.current) if self.current else None,
+            voice_channel_id=self.voice_channel_id,
+            text_channel_id=self.text_channel.id if self.text_channel else None
+        )
+
+    def restore(self, state: dict):
+        """Load saved state; stream URLs are re-resolved when tracks play"""
+        self.volume = state.get('volume', self.volume)
+        self.loop = state.get('loop', self.loop)
+        self.voice_channel_id = state.get('voice_channel_id')
+        if state.get('text_channel_id'):
+            self.text_channel = self.bot.get_channel(state['text_channel_id'])
+
+        journal, self.queue.journal = self.queue.journal, None
+        self.queue.extend(Track.from_info(info) for info in state.get('queue', []))
+        self.queue.journal = journal
+
+        # The interrupted track goes back to the front and starts over;
+        # in loop mode it is still queued already
+        if state.get('current') and not self.loop:
+            self.queue.appendleft(Track.from_info(state['current']))
+        logger.info(f"Restored {len(self.queue)} queued tracks for guild {self.guild_id}")
+
+    async def resume(self):
+        """Rejoin the saved voice channel and continue playback"""
+        channel = self.bot.get_channel(self.voice_channel_id) if self.voice_channel_id else None
+        if not channel or not self.queue:
+            self.save_state()
+            return
+        self.text_channel = self.text_channel or channel
+        self.post('queued')
+
+    def touch(self):
+        """Mark the player as active so the idle reaper leaves it alone"""
+        self.last_active = time.monotonic()
+
+    def _claim(self, ctx: discord.ApplicationContext):
+        """Remember where to post messages and which channel to join"""
+        self.text_channel = ctx.channel
+        if not ctx.guild.voice_client and ctx.author.voice:
+            self.voice_channel_id = ctx.author.voice.channel.id
+
+    async def add_to_queue(self, ctx: discord.ApplicationContext, source: Track, announce: bool = True):
         """Add track to queue and start playback if needed"""
+        self._claim(ctx)
+
         # Add track with requester info
         self.queue.append(source)
         position = len(self.queue)
         
         # Send embed response
-        embed = EmbedGenerator.added_to_queue(source, position)
-        await ctx.followup.send(embed=embed)
+        if announce:
+            embed = EmbedGenerator.added_to_queue(source, position)
+            await ctx.followup.send(embed=embed)
 
-        # Start playback if not active
-        vc = ctx.guild.voice_client
-        if not vc or not vc.is_playing():
-            await self.play_next(ctx)
+        # The consumer ignores this if something is already playing
+        self.post('queued')
 
-    async def play_next(self, ctx: discord.ApplicationContext):
-        """Play next track in queue"""
-        if not self.queue:
-            self.current = None
-            self.now_playing = None
+    async def add_tracks(self, ctx: discord.ApplicationContext, tracks: list):
+        """Enqueue many tracks at once and start playback if needed"""
+        self._claim(ctx)
+        self.queue.extend(tracks)
+        self.post('queued')
+
+    def post(self, event: str, *args):
+        """Hand an event to the playback consumer, starting it if needed"""
+        self.events.put_nowait((event, *args))
+        if self.consumer is None or self.consumer.done():
+            self.consumer = asyncio.get_running_loop().create_task(self._consume())
+
+    def _finished(self, generation: int, error: Exception = None):
+        # Runs on the audio thread: hand off to the loop, touch nothing else
+        try:
+            self.bot.loop.call_soon_threadsafe(self._on_finished, generation, error)
+        except RuntimeError:
+            pass  # Loop already closed during shutdown
+
+    def _on_finished(self, generation: int, error: Exception = None):
+        # Sources stopped by a skip or by shutdown report here too; dropping
+        # them keeps a shut-down player from starting a new consumer
+        if generation == self.generation:
+            self.post('finished', generation, error)
+
+    async def _consume(self):
+        """Drive the playback state machine, one event at a time
+
+        Only this task starts or stops tracks, so there is never more than
+        one playback start in flight. `generation` identifies the source that
+        is playing; completions from older sources are ignored.
+        """
+        while True:
+            event, *args = await self.events.get()
+            # Voice clients disconnecting as the bot closes must leave the
+            # queue and playback state as they were, so resume can use them
+            if self.bot.is_closed():
+                return
+            try:
+                if event == 'finished':
+                    generation, error = args
+                    if generation != self.generation:
+                        continue
+                    if error:
+                        logger.error(f"Player error in guild {self.guild_id}: {str(error)}")
+                    self.state = IDLE
+                elif event == 'skip':
+                    self.generation += 1
+                    # In loop mode the playing track is queued again; skip past it
+                    if self._loop_slot():
+                        self.queue.popleft()
+                    vc = self.guild.voice_client if self.guild else None
+                    if vc and (vc.is_playing() or vc.is_paused()):
+                        vc.stop()
+                    self.state = IDLE
+
+                if self.state == IDLE:
+                    await self._advance()
+            except Exception as e:
+                logger.error(f"Playback error in guild {self.guild_id}: {str(e)}")
+                self.state = IDLE
+
+    async def _advance(self):
+        """Start the next playable track, skipping tracks that keep failing"""
+        failed = []
+        while self.queue:
+            # Closing the bot must leave the queue and saved state for resume
+            if self.bot.is_closed():
+                return
+            self.state = STARTING
+            self.current = self.queue.popleft()
+
+            # Handle looping
+            if self.loop:
+                self.queue.appendleft(self.current)
+
+            try:
+                await self._start_with_retries(self.current)
+            except PlaybackError as e:
+                if e.stage == 'connect':
+                    # Nothing can play without voice; keep the track queued
+                    if not self.loop:
+                        self.queue.appendleft(self.current)
+                    failed = []
+                    self._send(EmbedGenerator.error(f"Failed to join voice: {str(e)}"))
+                    break
+                failed.append(self.current.title)
+                if len(failed) >= FAILURE_BUDGET:
+                    break
+                continue
+
+            self.state = PLAYING
+            if failed:
+                self._send(EmbedGenerator.error(self._failure_summary(failed)))
             return
 
-        self.current = self.queue.popleft()
-        
-        # Handle looping
-        if self.loop and self.current:
-            self.queue.appendleft(self.current)
-            
-        vc = ctx.guild.voice_client
+        self.current = None
+        self.now_playing = None
+        self.state = IDLE
+        self.save_state()
+        if failed:
+            message = self._failure_summary(failed)
+            if len(failed) >= FAILURE_BUDGET:
+                message += f"\nStopped after {len(failed)} failures in a row"
+            self._send(EmbedGenerator.error(message))
+
+    @staticmethod
+    def _failure_summary(titles: list) -> str:
+        if len(titles) == 1:
+            return f"Couldn't load {titles[0]}"
+        return f"Skipped {len(titles)} tracks that couldn't be loaded"
+
+    async def _start_with_retries(self, track: Track):
+        for attempt in range(PLAYBACK_ATTEMPTS):
+            if attempt:
+                await asyncio.sleep(RETRY_BACKOFF * 2 ** (attempt - 1))
+            try:
+                return await self._start(track)
+            except PlaybackError as e:
+                logger.error(f"Playback {e.stage} error for {track.title}: {str(e)}")
+                PLAYBACK_ERRORS.inc(stage=e.stage)
+                if e.stage == 'connect' or attempt == PLAYBACK_ATTEMPTS - 1:
+                    raise
+
+    async def _start(self, track: Track):
+        """Resolve, connect and play one track"""
+        # Re-resolve the stream URL just in time if the prefetch missed it
+        cached_path = AUDIO_CACHE.path(track) if AUDIO_CACHE else None
+        if not cached_path and not await self._refresh(track):
+            raise PlaybackError('resolve', "Stream refresh failed")
+
+        vc = self.guild.voice_client
 
         # Connect to voice if needed
         if not vc:
+            channel = self.bot.get_channel(self.voice_channel_id) if self.voice_channel_id else None
+            if not channel:
+                raise PlaybackError('connect', "No voice channel to join")
             try:
-                vc = await ctx.author.voice.channel.connect()
+                vc = await channel.connect()
             except Exception as e:
-                logger.error(f"Connection error: {str(e)}")
-                embed = EmbedGenerator.error(f"Failed to join voice: {str(e)}")
-                await ctx.channel.send(embed=embed)
-                return
+                raise PlaybackError('connect', str(e))
+        self.voice_channel_id = vc.channel.id
 
+        self.generation += 1
+        generation = self.generation
         try:
-            # Play audio with reconnect options
-            vc.play(
-                discord.FFmpegPCMAudio(
-                    self.current['url'], 
-                    before_options="-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5"
-                ),
-                after=lambda e: asyncio.run_coroutine_threadsafe(
-                    self.play_next(ctx), 
-                    self.bot.loop
-                )
+            if vc.is_playing() or vc.is_paused():
+                vc.stop()
+            vc.play(self.create_audio(cached_path), after=lambda e: self._finished(generation, e))
+        except Exception as e:
+            raise PlaybackError('play', str(e))
+
+        self.started_at = time.monotonic()
+        self.offset = 0.0
+        self.schedule_prefetch()
+        self.touch()
+        self.save_state()
+        TRACKS_STARTED.inc()
+        POPULARITY.record(track)
+
+        # Send now playing embed
+        self.now_playing = track
+        if self.text_channel:
+            MESSAGES.channel(self.text_channel).now_playing(EmbedGenerator.now_playing(track))
+
+    def _send(self, embed: discord.Embed):
+        """Queue a notice; the channel's coordinator batches and paces it"""
+        if self.text_channel:
+            MESSAGES.channel(self.text_channel).notice(embed)
+
+    def create_audio(self, cached_path: str = None, offset: float = 0) -> discord.AudioSource:
+        """Build the audio source for the current track, starting `offset` seconds in
+
+        Decoding, volume scaling and Opus encoding all happen in the FFmpeg
+        process, so the bot only forwards ready Opus packets and does no
+        per-frame work of its own. At unity volume Opus input (cached files
+        and Opus streams) is copied without re-encoding.
+        """
+        if cached_path:
+            source, before = cached_path, ''
+            opus = AUDIO_CACHE.is_opus(cached_path)
+        else:
+            source, before = self.current.url, FFMPEG_BEFORE_OPTS
+            opus = self.current.acodec == 'opus'
+        if offset:
+            before = f"-ss {offset:.2f} {before}".strip()
+
+        if self.volume == 1.0:
+            return discord.FFmpegOpusAudio(
+                source, codec='opus' if opus else None, before_options=before or None
             )
-            vc.source = discord.PCMVolumeTransformer(vc.source, volume=self.volume)
-            
-            # Send now playing embed
-            self.now_playing = self.current
-            embed = EmbedGenerator.now_playing(self.current)
-            await ctx.channel.send(embed=embed)
+        return discord.FFmpegOpusAudio(
+            source, before_options=before or None, options=f"-af volume={self.volume:.2f}"
+        )
+
+    def position(self) -> float:
+        """Seconds into the current track"""
+        return self.offset + time.monotonic() - self.started_at
+
+    def restart_audio(self, vc: discord.VoiceClient) -> bool:
+        """Swap in a new FFmpeg process at the current position to apply settings"""
+        cached_path = AUDIO_CACHE.path(self.current) if AUDIO_CACHE else None
+        if not cached_path and YTDLSource.needs_refresh(self.current):
+            return False
+        position = self.position()
+        old = vc.source
+        try:
+            vc.source = self.create_audio(cached_path, position)
         except Exception as e:
-            # Handle playback errors
-            logger.error(f"Playback error: {str(e)}")
-            embed = EmbedGenerator.error(f"Playback error: {str(e)}")
-            await ctx.channel.send(embed=embed)
-            await self.play_next(ctx)
+            logger.error(f"Audio restart failed: {str(e)}")
+            return False
+        self.offset = position
+        self.started_at = time.monotonic()
+        # The voice thread may still be reading a frame from the old process
+        asyncio.get_running_loop().call_later(1, old.cleanup)
+        return True
+
+    def schedule_prefetch(self):
+        """Refresh the next track's stream URL shortly before it starts"""
+        if self.prefetch_task:
+            self.prefetch_task.cancel()
+        delay = max(0, self.current.duration - PREFETCH_LEAD)
+        self.prefetch_task = asyncio.create_task(self._prefetch(delay))
+
+        # Pre-download the next few tracks while this one plays
+        if AUDIO_CACHE:
+            for track in self.queue.slice(0, AUDIO_PREFETCH_DEPTH):
+                task = asyncio.create_task(AUDIO_CACHE.prefetch(track))
+                self.downloads.add(task)
+                task.add_done_callback(self.downloads.discard)
+
+    async def _prefetch(self, delay: float):
+        await asyncio.sleep(delay)
+        if not self.queue:
+            return
+        track = self.queue[0]
+        if AUDIO_CACHE and AUDIO_CACHE.path(track):
+            return
+        try:
+            await self._refresh(track, within=PREFETCH_LEAD)
+        except Exception as e:
+            logger.error(f"Prefetch error: {str(e)}")
+
+    async def _refresh(self, track: Track, within: float = 0) -> bool:
+        """Refresh a stream URL in this guild's turn of the resolution queue"""
+        if not YTDLSource.needs_refresh(track, within):
+            return True
+        async with ADMISSION.enqueue(self.guild_id):
+            return await YTDLSource.refresh(track, within)
 
     async def skip(self, ctx: discord.ApplicationContext):
-        vc = ctx.guild.voice_client
-        if vc and vc.is_playing():
-            vc.stop()
-            await asyncio.sleep(0.5)  # Allow the after callback to trigger
+        """Skip the current track; the consumer starts the next one"""
+        self.post('skip')
 
-    async def show_queue(self, ctx: discord.ApplicationContext):
-        page = 1  # For now, implement pagination later
-        total_pages = (len(self.queue) + 9) // 10  # 10 per page
-        
-        embed = EmbedGenerator.queue_list(
-            queue=list(self.queue),
-            current=self.now_playing,
-            page=page,
-            total_pages=total_pages
-        )
-        await ctx.respond(embed=embed)
+    def queue_page(self, page: int):
+        """Return (embed, page) for a queue page, clamped to the valid range
+
+        Pages are rendered lazily from a slice of the queue and cached
+        until the queue version or the current track changes.
+        """
+        total_pages = max(1, (len(self.queue) + QUEUE_PAGE_SIZE - 1) // QUEUE_PAGE_SIZE)
+        page = max(1, min(page, total_pages))
+
+        key = (self.queue.version, self.now_playing)
+        if key != self.page_cache_key:
+            self.page_cache.clear()
+            self.page_cache_key = key
+
+        embed = self.page_cache.get(page)
+        if embed is None:
+            start = (page - 1) * QUEUE_PAGE_SIZE
+            embed = self.page_cache[page] = EmbedGenerator.queue_list(
+                tracks=self.queue.slice(start, start + QUEUE_PAGE_SIZE),
+                current=self.now_playing,
+                page=page,
+                total_pages=total_pages,
+                total_tracks=len(self.queue),
+                total_duration=self.queue.total_duration,
+                start=start
+            )
+        return embed, page
+
+    async def show_queue(self, ctx: discord.ApplicationContext, page: int = 1, view: discord.ui.View = None):
+        embed, page = self.queue_page(page)
+        await ctx.respond(embed=embed, view=view)
 
     async def remove(self, ctx: discord.ApplicationContext, index: int):
         if 1 <= index <= len(self.queue):
-            removed = list(self.queue)[index-1]
-            del self.queue[index-1]
+            removed = self.queue.pop(index-1)
             
             # Create custom removal embed
             embed = EmbedGenerator.added_to_queue(removed, 0)
@@ -113,13 +454,81 @@ class Player:
             embed = EmbedGenerator.error("Invalid queue position")
             await ctx.respond(embed=embed)
 
-    async def set_volume(self, ctx: discord.ApplicationContext, level: float):
+    def _loop_slot(self) -> int:
+        # In loop mode the playing track waits at the front of the queue
+        if self.loop and self.current is not None and self.queue and self.queue[0] is self.current:
+            return 1
+        return 0
+
+    async def shuffle(self, ctx: discord.ApplicationContext):
+        start = self._loop_slot()
+        count = len(self.queue) - start
+        if count < 2:
+            await ctx.respond(embed=EmbedGenerator.error("Not enough tracks to shuffle"))
+            return
+        self.queue.shuffle(start)
+        await ctx.respond(embed=EmbedGenerator.success(f"Shuffled {count} tracks"))
+
+    async def move(self, ctx: discord.ApplicationContext, src: int, dst: int):
+        # Like shuffle, leave the looping track in place
+        first = self._loop_slot() + 1
+        size = len(self.queue)
+        if not (first <= src <= size and first <= dst <= size):
+            await ctx.respond(embed=EmbedGenerator.error("Invalid queue position"))
+            return
+        track = self.queue.move(src - 1, dst - 1)
+        await ctx.respond(embed=EmbedGenerator.success(f"Moved **{track.title}** to position {dst}"))
+
+    async def dedupe(self, ctx: discord.ApplicationContext):
+        removed = self.queue.dedupe()
+        message = f"Removed {removed} duplicate tracks" if removed else "No duplicates in the queue"
+        await ctx.respond(embed=EmbedGenerator.success(message))
+
+    async def clear(self, ctx: discord.ApplicationContext):
+        # Like shuffle, leave the looping track in place
+        keep = self.queue.slice(0, self._loop_slot())
+        count = len(self.queue) - len(keep)
+        self.queue.clear()
+        self.queue.extend(keep)
+        await ctx.respond(embed=EmbedGenerator.success(f"Cleared {count} tracks from the queue"))
+
+    async def remove_requester(self, ctx: discord.ApplicationContext, member: discord.Member):
+        # Matched on id: display names are not unique within a guild
+        name = member.display_name
+        removed = self.queue.remove_where(
+            lambda track: track.requester_id == member.id, self._loop_slot()
+        )
+        if removed:
+            embed = EmbedGenerator.success(f"Removed {removed} tracks requested by {name}")
+        else:
+            embed = EmbedGenerator.error(f"No queued tracks from {name}")
+        await ctx.respond(embed=embed)
+
+    async def set_loop(self, ctx: discord.ApplicationContext, enabled: bool):
+        """Turn repeating the current track on or off"""
+        if enabled != self.loop:
+            # _advance re-queues the looping track when it starts; do the
+            # same (or undo it) for the track that is already playing
+            if enabled and self.current is not None:
+                self.queue.appendleft(self.current)
+            elif self._loop_slot():
+                self.queue.popleft()
+            self.loop = enabled
+            self.save_state()
+        state = "on" if enabled else "off"
+        await ctx.respond(embed=EmbedGenerator.success(f"Looping is {state}"))
+
+    async def set_volume(self, ctx: discord.ApplicationContext, level: float) -> bool:
+        """Set the volume; returns False if it only applies from the next track"""
         self.volume = max(0.0, min(1.0, level))
+        self.save_state()
         vc = ctx.guild.voice_client
-        if vc and vc.source:
-            vc.source.volume = self.volume
+        if vc and vc.source and self.state == PLAYING:
+            # FFmpeg applies the volume, so restart it where playback is
+            return self.restart_audio(vc)
+        return True
 
-    async def now_playing(self, ctx: discord.ApplicationContext):
+    async def show_now_playing(self, ctx: discord.ApplicationContext):
         if self.now_playing:
             embed = EmbedGenerator.now_playing(self.now_playing)
             # Add player status
@@ -133,7 +542,67 @@ class Player:
     async def disconnect(self, ctx: discord.ApplicationContext):
         vc = ctx.guild.voice_client
         if vc:
-            await vc.disconnect()
-            self.queue.clear()
-            self.current = None
-            self.now_playing = None
\ No newline at end of file
+            await self.shutdown()
+
+    async def shutdown(self):
+        """Stop playback, drop the queue and leave voice"""
+        if self.prefetch_task:
+            self.prefetch_task.cancel()
+        # Downloads shared with other guilds carry on without this one
+        for task in list(self.downloads):
+            task.cancel()
+        if self.consumer:
+            self.consumer.cancel()
+        self.events = asyncio.Queue()
+        self.state = IDLE
+        self.generation += 1
+        self.queue.clear()
+        self.current = None
+        self.now_playing = None
+        self.save_state()
+
+        # Disconnecting stops the FFmpeg process behind the source
+        guild = self.bot.get_guild(self.guild_id)
+        if guild and guild.voice_client:
+            await guild.voice_client.disconnect(force=True)
+
+
+class PlayerRegistry:
+    """Guild players partitioned by the shard that owns each guild
+
+    Behaves like a {guild_id: Player} dict; `shard(shard_id)` exposes one
+    shard's partition for per-shard accounting.
+    """
+
+    def __init__(self, bot: discord.Bot):
+        self.bot = bot
+        self.shards = {}
+
+    def shard_of(self, guild_id: int) -> int:
+        # Discord's routing formula: (guild_id >> 22) % shard_count
+        count = getattr(self.bot, 'shard_count', None) or 1
+        return (guild_id >> 22) % count
+
+    def shard(self, shard_id: int) -> dict:
+        return self.shards.setdefault(shard_id, {})
+
+    def __contains__(self, guild_id: int) -> bool:
+        return guild_id in self.shards.get(self.shard_of(guild_id), {})
+
+    def __getitem__(self, guild_id: int) -> Player:
+        return self.shards[self.shard_of(guild_id)][guild_id]
+
+    def __setitem__(self, guild_id: int, player: Player):
+        self.shard(self.shard_of(guild_id))[guild_id] = player
+
+    def pop(self, guild_id: int, default=None):
+        return self.shards.get(self.shard_of(guild_id), {}).pop(guild_id, default)
+
+    def __len__(self) -> int:
+        return sum(len(players) for players in self.shards.values())
+
+    def items(self):
+        return [item for players in self.shards.values() for item in players.items()]
+
+    def values(self):
+        return [player for players in self.shards.values() for player in players.values()]
@@ -0,0 +1,101 @@
+import os
+import time
+import heapq
+import logging
+from utils.metrics import Counter, Gauge
+
+logger = logging.getLogger('hertz')
+
+# Hours after which a play counts half as much
+POPULARITY_HALF_LIFE = float(os.getenv('POPULARITY_HALF_LIFE_HOURS', '24')) * 3600
+POPULARITY_MAX_TRACKS = int(os.getenv('POPULARITY_MAX_TRACKS', '5000'))
+
+# Metadata kept per track so it can be warmed and suggested without a lookup
+INDEXED_FIELDS = ('id', 'title', 'webpage_url', 'artist', 'duration', 'thumbnail')
+
+
+class PopularityIndex:
+    """Play counts across all guilds, decaying with a fixed half-life
+
+    Scores are stored scaled to a moving epoch: a play adds 2^(age/half_life)
+    instead of decaying every other entry, so recording is O(1) and the
+    ranking never needs a decay pass. Scores are rescaled before the float
+    range runs out, and the lowest entries are dropped past `max_tracks`.
+    """
+
+    # Rebase once the scale factor reaches 2^REBASE_AFTER
+    REBASE_AFTER = 512
+
+    def __init__(self, half_life: float = POPULARITY_HALF_LIFE, max_tracks: int = POPULARITY_MAX_TRACKS):
+        self.half_life = half_life
+        self.max_tracks = max_tracks
+        self.epoch = time.time()
+        self.scores = {}
+        self.tracks = {}
+        self.plays = 0
+
+    def _weight(self, now: float) -> float:
+        exponent = (now - self.epoch) / self.half_life
+        if exponent > self.REBASE_AFTER:
+            self._rebase(now)
+            exponent = 0.0
+        return 2.0 ** exponent
+
+    def _rebase(self, now: float):
+        factor = 2.0 ** ((now - self.epoch) / self.half_life)
+        self.scores = {vid: score / factor for vid, score in self.scores.items()}
+        self.epoch = now
+
+    def record(self, track):
+        """Count one play of a track"""
+        if not track.id:
+            return
+        self.plays += 1
+        self.scores[track.id] = self.scores.get(track.id, 0.0) + self._weight(time.time())
+        self.tracks[track.id] = {k: getattr(track, k) for k in INDEXED_FIELDS}
+        if len(self.scores) > self.max_tracks:
+            self._trim()
+
+    def _trim(self):
+        # Drop the bottom tenth at once so trimming stays rare
+        keep = int(self.max_tracks * 0.9)
+        kept = heapq.nlargest(keep, self.scores.items(), key=lambda item: item[1])
+        self.scores = dict(kept)
+        self.tracks = {vid: self.tracks[vid] for vid in self.scores}
+
+    def score(self, video_id: str) -> float:
+        """Decayed play count as of now"""
+        scaled = self.scores.get(video_id, 0.0)
+        return scaled / (2.0 ** ((time.time() - self.epoch) / self.half_life))
+
+    def top(self, count: int) -> list:
+        """Metadata of the `count` most played tracks"""
+        best = heapq.nlargest(count, self.scores.items(), key=lambda item: item[1])
+        return [self.tracks[vid] for vid, _ in best]
+
+    def suggest(self, query: str, limit: int) -> list:
+        """Most played tracks whose title or artist contains every query word"""
+        words = query.lower().split()
+        if not words:
+            return []
+        matches = []
+        for vid, info in self.tracks.items():
+            text = f"{info['artist']} {info['title']}".lower()
+            if all(word in text for word in words):
+                matches.append((self.scores[vid], info))
+        return [info for _, info in heapq.nlargest(limit, matches, key=lambda m: m[0])]
+
+    def stats(self) -> dict:
+        return {'tracks': len(self.scores), 'plays': self.plays}
+
+
+POPULARITY = PopularityIndex()
+
+Gauge(
+    'soundscape_popularity_tracks', 'Tracks tracked by the popularity index',
+    function=lambda: len(POPULARITY.scores)
+)
+Counter(
+    'soundscape_popularity_plays_total', 'Plays recorded by the popularity index',
+    function=lambda: POPULARITY.plays
+)
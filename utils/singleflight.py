@@ -0,0 +1,61 @@
+import copy
+import asyncio
+from utils.metrics import Counter
+
+
+class SingleFlight:
+    """Share one in-flight call between concurrent identical requests
+
+    The first caller for a key runs the work; callers arriving while it is
+    still running await the same future and get their own shallow copy of
+    the result. Cancelling one waiter never cancels the shared call.
+    """
+
+    instances = []
+
+    def __init__(self, name: str):
+        SingleFlight.instances.append(self)
+        self.name = name
+        self.inflight = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key, fn):
+        """Run `fn()` for `key`, or join the call already in flight"""
+        future = self.inflight.get(key)
+        if future is None:
+            self.calls += 1
+            future = asyncio.ensure_future(fn())
+            self.inflight[key] = future
+            future.add_done_callback(lambda f: self._done(key, f))
+        else:
+            self.coalesced += 1
+        return copy.copy(await asyncio.shield(future))
+
+    def _done(self, key, future):
+        if self.inflight.get(key) is future:
+            del self.inflight[key]
+        # Avoid "exception was never retrieved" when every waiter is gone
+        if not future.cancelled():
+            future.exception()
+
+    def stats(self) -> dict:
+        return {
+            'calls': self.calls,
+            'coalesced': self.coalesced,
+            'inflight': len(self.inflight)
+        }
+
+
+def _flight_counts() -> dict:
+    counts = {}
+    for flight in SingleFlight.instances:
+        counts[(flight.name, 'call')] = flight.calls
+        counts[(flight.name, 'coalesced')] = flight.coalesced
+    return counts
+
+
+Counter(
+    'soundscape_singleflight_requests_total', 'Lookups that ran or joined an in-flight call',
+    ('name', 'kind'), function=_flight_counts
+)
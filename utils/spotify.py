@@ -1,28 +1,322 @@
-import spotipy
-from spotipy.oauth2 import SpotifyClientCredentials
+import os
+import re
+import json
+import time
 import asyncio
+import logging
+import sqlite3
+import threading
+from utils.cache import LRUCache, WriteBuffer
+from utils.singleflight import SingleFlight
+from utils.metrics import Counter, Histogram
+from utils.track import Track
+from utils.ytdl import YTDLSource
+
+logger = logging.getLogger('hertz')
+
+# Spotify API page size limits
+PLAYLIST_PAGE = 100
+ALBUM_PAGE = 50
+TRACKS_BATCH = 50
+
+# Track metadata cache, keyed by Spotify track id
+SPOTIFY_CACHE_SIZE = int(os.getenv('SPOTIFY_CACHE_SIZE', '4096'))
+SPOTIFY_CACHE_TTL = float(os.getenv('SPOTIFY_CACHE_TTL', '86400'))
+
+# YouTube results considered per lookup, and how far (in seconds) a
+# result's duration may be from Spotify's to count as the same recording
+MATCH_CANDIDATES = int(os.getenv('SPOTIFY_MATCH_CANDIDATES', '5'))
+MATCH_TOLERANCE = float(os.getenv('SPOTIFY_MATCH_TOLERANCE', '5'))
+
+COLLECTION_RE = re.compile(r'open\.spotify\.com/(?:intl-\w+/)?(playlist|album)/(\w+)')
+TRACK_RE = re.compile(r'(?:open\.spotify\.com/(?:intl-\w+/)?track/|spotify:track:)(\w+)')
+
+SPOTIFY_FLIGHTS = SingleFlight('spotify')
+SPOTIFY_SECONDS = Histogram(
+    'soundscape_spotify_request_seconds', 'Spotify Web API request time', ('endpoint',)
+)
+SPOTIFY_MATCHES_TOTAL = Counter(
+    'soundscape_spotify_matches_total', 'Spotify to YouTube matches by how they were found',
+    ('method',)
+)
+
+
+class SpotifyMatches:
+    """Spotify track id -> matched YouTube track info
+
+    Kept in memory and, when `db_path` is set, in SQLite so matches survive
+    restarts; the database is only touched from worker threads. Matches do
+    not expire: a recording keeps its ISRC and length.
+    """
+
+    def __init__(self, maxsize: int = 8192, db_path: str = None, flush_interval: float = 1.0):
+        self.memory = LRUCache(maxsize, 0)
+        self._db = None
+        self._db_lock = threading.Lock()
+        self.writes = WriteBuffer(self._write, flush_interval)
+        if db_path:
+            try:
+                self._db = sqlite3.connect(db_path, check_same_thread=False)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS spotify_matches ("
+                    "spotify_id TEXT PRIMARY KEY, info TEXT NOT NULL, stored REAL NOT NULL)"
+                )
+                self._db.commit()
+                logger.info(f"Spotify matches persisted to {db_path}")
+            except sqlite3.Error as e:
+                logger.error(f"Spotify match store disabled disk tier: {str(e)}")
+                self._db = None
+
+    def _read(self, spotify_id: str):
+        with self._db_lock:
+            return self._db.execute(
+                "SELECT info FROM spotify_matches WHERE spotify_id = ?", (spotify_id,)
+            ).fetchone()
+
+    def _write(self, rows: list):
+        with self._db_lock:
+            try:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO spotify_matches (spotify_id, info, stored) VALUES (?, ?, ?)",
+                    [(spotify_id, json.dumps(info), stored) for spotify_id, info, stored in rows]
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                self._db.rollback()
+                logger.error(f"Spotify match write failed: {str(e)}")
+
+    def known(self, spotify_id: str) -> bool:
+        """Whether a match is held in memory, without reading the disk"""
+        return self.memory.get(spotify_id) is not None
+
+    async def get(self, spotify_id: str):
+        info = self.memory.get(spotify_id)
+        if info is None and self._db is not None:
+            try:
+                row = await asyncio.to_thread(self._read, spotify_id)
+            except sqlite3.Error as e:
+                logger.error(f"Spotify match read failed: {str(e)}")
+                row = None
+            if row:
+                info = json.loads(row[0])
+                self.memory.set(spotify_id, info)
+        return dict(info) if info else None
+
+    def put(self, spotify_id: str, info: dict):
+        self.memory.set(spotify_id, info)
+        if self._db is not None:
+            self.writes.add((spotify_id, info, time.time()))
+
+
+SPOTIFY_MATCHES = SpotifyMatches(
+    db_path=os.getenv('SPOTIFY_MATCH_DB') or None,
+    flush_interval=float(os.getenv('SPOTIFY_MATCH_FLUSH_INTERVAL', '1.0'))
+)
+
+
+def closest_match(candidates: list, duration: int):
+    """The candidate closest to `duration`, if any is within MATCH_TOLERANCE seconds"""
+    if not duration:
+        return None
+    close = [c for c in candidates if c['duration'] and abs(c['duration'] - duration) <= MATCH_TOLERANCE]
+    return min(close, key=lambda c: abs(c['duration'] - duration)) if close else None
+
 
 class SpotifyHandler:
     def __init__(self, client_id: str, client_secret: str):
-        self.auth = SpotifyClientCredentials(
-            client_id=client_id,
-            client_secret=client_secret
-        )
-        self.sp = spotipy.Spotify(auth_manager=self.auth)
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self._sp = None
+        self.tracks = LRUCache(SPOTIFY_CACHE_SIZE, SPOTIFY_CACHE_TTL)
+
+    @property
+    def sp(self):
+        """Spotify client, built on first use so spotipy stays out of startup"""
+        if self._sp is None:
+            import spotipy
+            from spotipy.cache_handler import MemoryCacheHandler
+            from spotipy.oauth2 import SpotifyClientCredentials
+            # One client-credentials token, held in memory and renewed only
+            # when it expires, serves every call
+            auth = SpotifyClientCredentials(
+                client_id=self.client_id,
+                client_secret=self.client_secret,
+                cache_handler=MemoryCacheHandler()
+            )
+            self._sp = spotipy.Spotify(auth_manager=auth)
+        return self._sp
+
+    @sp.setter
+    def sp(self, client):
+        self._sp = client
+
+    async def _call(self, endpoint: str, *args, **kwargs):
+        """Run a blocking spotipy call in a thread and time it"""
+        with SPOTIFY_SECONDS.time(endpoint=endpoint):
+            return await asyncio.to_thread(getattr(self.sp, endpoint), *args, **kwargs)
+
+    @staticmethod
+    def is_collection(url: str) -> bool:
+        """Check whether a Spotify URL points at a playlist or album"""
+        return bool(COLLECTION_RE.search(url))
+
+    @staticmethod
+    def _format(track: dict, album: dict = None) -> dict:
+        album = album or track['album']
+        return {
+            'title': track['name'],
+            'artist': track['artists'][0]['name'] if track['artists'] else '',
+            'duration': track['duration_ms'] // 1000,
+            'thumbnail': album['images'][0]['url'] if album.get('images') else '',
+            'album': album['name'],
+            'is_spotify': True,
+            'webpage_url': track.get('external_urls', {}).get('spotify', ''),
+            'spotify_id': track.get('id'),
+            'isrc': track.get('external_ids', {}).get('isrc')
+        }
 
     async def get_track_info(self, url: str) -> dict:
         """Get track info from Spotify URL"""
+        match = TRACK_RE.search(url)
+        key = match.group(1) if match else url
+        cached = self.tracks.get(key)
+        if cached is not None:
+            return dict(cached)
         try:
-            track = await asyncio.to_thread(self.sp.track, url)
-            return {
-                'title': track['name'],
-                'artist': track['artists'][0]['name'],
-                'duration': track['duration_ms'] // 1000,
-                'thumbnail': track['album']['images'][0]['url'] if track['album']['images'] else '',
-                'album': track['album']['name'],
-                'is_spotify': True,
-                'webpage_url': url  # Use original Spotify URL
-            }
+            # Concurrent lookups of the same track share one API call
+            track = await SPOTIFY_FLIGHTS.do(key, lambda: self._call('track', url))
+            info = self._format(track)
+            info['webpage_url'] = url  # Use original Spotify URL
+            self.tracks.set(key, info)
+            return dict(info)
         except Exception as e:
             print(f"Spotify Error: {e}")
-            return None
\ No newline at end of file
+            return None
+
+    @staticmethod
+    def is_matched(url: str) -> bool:
+        """Whether a Spotify track URL has a YouTube match held in memory"""
+        match = TRACK_RE.search(url)
+        return bool(match and SPOTIFY_MATCHES.known(match.group(1)))
+
+    async def resolve_track(self, url: str) -> Track:
+        """YouTube track for a Spotify track URL
+
+        A previously matched track needs neither the Spotify API nor a
+        YouTube search.
+        """
+        match = TRACK_RE.search(url)
+        known = await SPOTIFY_MATCHES.get(match.group(1)) if match else None
+        if known:
+            SPOTIFY_MATCHES_TOTAL.inc(method='stored')
+            return Track.from_info(known)
+        info = await self.get_track_info(url)
+        return await self.match(info) if info else None
+
+    async def match(self, info: dict) -> Track:
+        """Find the YouTube recording of a Spotify track
+
+        The ISRC is searched first, then "artist - title"; a result is only
+        accepted when its length agrees with Spotify's, otherwise the top
+        text result is used. Only the stream is left to resolve at playback.
+        """
+        spotify_id = info.get('spotify_id')
+        known = await SPOTIFY_MATCHES.get(spotify_id) if spotify_id else None
+        if known:
+            SPOTIFY_MATCHES_TOTAL.inc(method='stored')
+            return Track.from_info(known)
+        if spotify_id:
+            return await SPOTIFY_FLIGHTS.do(f"match:{spotify_id}", lambda: self._match(info))
+        return await self._match(info)
+
+    async def _match(self, info: dict) -> Track:
+        best, method = None, 'isrc'
+        if info.get('isrc'):
+            candidates = await YTDLSource.search_candidates(f'"{info["isrc"]}"', MATCH_CANDIDATES)
+            best = closest_match(candidates, info['duration'])
+        if best is None:
+            method = 'duration'
+            candidates = await YTDLSource.search_candidates(
+                f"{info['artist']} - {info['title']}", MATCH_CANDIDATES
+            )
+            best = closest_match(candidates, info['duration'])
+            if best is None and candidates:
+                best, method = candidates[0], 'top_result'
+        if best is None:
+            return None
+        SPOTIFY_MATCHES_TOTAL.inc(method=method)
+
+        # Play the YouTube recording, but show Spotify's metadata
+        matched = dict(best)
+        for key in ('title', 'artist', 'album', 'thumbnail', 'duration'):
+            if info.get(key):
+                matched[key] = info[key]
+        matched['is_spotify'] = True
+        if info.get('spotify_id'):
+            SPOTIFY_MATCHES.put(info['spotify_id'], matched)
+        return Track.from_info(matched)
+
+    async def _album_page(self, items: list, album: dict) -> list:
+        """Track info for a page of album tracks
+
+        Album listings hold simplified tracks without ISRCs, so tracks not
+        already cached are fetched in full, TRACKS_BATCH per call.
+        """
+        infos = {}
+        missing = []
+        for track in items:
+            cached = self.tracks.get(track.get('id'))
+            if cached is not None:
+                infos[track['id']] = dict(cached)
+            elif track.get('id'):
+                missing.append(track['id'])
+        for start in range(0, len(missing), TRACKS_BATCH):
+            batch = missing[start:start + TRACKS_BATCH]
+            try:
+                full = (await self._call('tracks', batch))['tracks']
+            except Exception as e:
+                # Still playable without an ISRC, just matched by search
+                logger.error(f"Spotify album track lookup failed: {str(e)}")
+                continue
+            for track in full:
+                if track:
+                    info = self._format(track, album)
+                    self.tracks.set(info['spotify_id'], info)
+                    infos[info['spotify_id']] = info
+        return [infos.get(track.get('id')) or self._format(track, album) for track in items]
+
+    async def iter_collection(self, url: str):
+        """Yield track info for every track in a playlist or album, page by page"""
+        kind, collection_id = COLLECTION_RE.search(url).groups()
+
+        if kind == 'playlist':
+            offset = 0
+            while True:
+                page = await self._call(
+                    'playlist_items', collection_id,
+                    limit=PLAYLIST_PAGE, offset=offset, additional_types=('track',)
+                )
+                for item in page['items']:
+                    track = item.get('track')
+                    # Skip local files, episodes and removed tracks
+                    if track and track.get('type') == 'track' and not track.get('is_local'):
+                        info = self._format(track)
+                        self.tracks.set(info['spotify_id'], info)
+                        yield info
+                if not page.get('next'):
+                    break
+                offset += PLAYLIST_PAGE
+        else:
+            album = await self._call('album', collection_id)
+            page = album['tracks']
+            offset = 0
+            while True:
+                for info in await self._album_page(page['items'], album):
+                    yield info
+                if not page.get('next'):
+                    break
+                offset += len(page['items'])
+                page = await self._call(
+                    'album_tracks', collection_id, limit=ALBUM_PAGE, offset=offset
+                )
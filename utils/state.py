@@ -0,0 +1,208 @@
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger('hertz')
+
+# Track fields worth persisting; stream URLs expire and are re-resolved
+PERSISTED_FIELDS = (
+    'id', 'title', 'webpage_url', 'duration', 'thumbnail', 'artist', 'album',
+    'source', 'is_spotify', 'requester', 'requester_avatar', 'requester_id'
+)
+
+
+def track_state(track) -> dict:
+    return {k: getattr(track, k) for k in PERSISTED_FIELDS}
+
+
+def replay(tracks: list, op: str, args: list) -> list:
+    """Apply one journalled queue operation to a list of track dicts"""
+    if op == 'append':
+        tracks.append(args[0])
+    elif op == 'appendleft':
+        tracks.insert(0, args[0])
+    elif op == 'insert':
+        tracks.insert(max(0, args[0]), args[1])
+    elif op == 'pop':
+        try:
+            del tracks[args[0]]
+        except IndexError:
+            pass
+    elif op == 'clear':
+        tracks.clear()
+    elif op == 'snapshot':
+        tracks[:] = args[0]
+    return tracks
+
+
+class StateStore:
+    """SQLite-backed player state with an append-only queue journal
+
+    Queue mutations are buffered in memory and written in one transaction
+    per flush, so a mutation costs an O(1) list append on the event loop.
+    Per-guild settings are coalesced and upserted on the same flush. Once a
+    guild has journalled `compact_after` operations its queue is written
+    as a snapshot and the older entries are dropped.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 1.0, compact_after: int = 500):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.compact_after = compact_after
+        self.pending = []
+        self.pending_players = {}
+        self.writing = ([], {})
+        self.journalled = {}
+        self.flush_task = None
+        self._flush_lock = asyncio.Lock()
+        self._db_lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS queue_log ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, guild_id INTEGER NOT NULL, "
+            "op TEXT NOT NULL, args TEXT NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS queue_log_guild ON queue_log (guild_id, seq)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS players ("
+            "guild_id INTEGER PRIMARY KEY, state TEXT NOT NULL, updated REAL NOT NULL)"
+        )
+        self._db.commit()
+        logger.info(f"Player state persisted to {path}")
+
+    def record(self, guild_id: int, op: str, *args):
+        """Buffer one queue operation for the next flush"""
+        count = self.journalled.get(guild_id, 0) + 1
+        self.journalled[guild_id] = count
+        self.pending.append((guild_id, op, json.dumps(args, default=track_state)))
+        self._ensure_flusher()
+
+    def snapshot(self, guild_id: int, tracks):
+        """Replace a guild's journal with the full queue
+
+        Only the track list is copied here; the flush serializes it off the
+        event loop. Buffered operations it supersedes are dropped.
+        """
+        self.journalled[guild_id] = 0
+        self.pending = [event for event in self.pending if event[0] != guild_id]
+        self.pending.append((guild_id, 'snapshot', list(tracks)))
+        self._ensure_flusher()
+
+    @staticmethod
+    def _encode(op: str, args) -> str:
+        if isinstance(args, str):
+            return args
+        return json.dumps([[track_state(t) for t in args]])
+
+    def needs_compaction(self, guild_id: int) -> bool:
+        return self.journalled.get(guild_id, 0) >= self.compact_after
+
+    def update_player(self, guild_id: int, **fields):
+        """Coalesce settings/status changes for the next flush"""
+        self.pending_players.setdefault(guild_id, {}).update(fields)
+        self._ensure_flusher()
+
+    def _ensure_flusher(self):
+        if self.flush_task is None or self.flush_task.done():
+            try:
+                self.flush_task = asyncio.get_running_loop().create_task(self._flush_later())
+            except RuntimeError:
+                pass
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        await self.flush()
+
+    async def flush(self):
+        """Write everything buffered so far in a single transaction"""
+        async with self._flush_lock:
+            events, self.pending = self.pending, []
+            players, self.pending_players = self.pending_players, {}
+            if events or players:
+                self.writing = (events, players)
+                await asyncio.to_thread(self._write, events, players)
+
+    def flush_sync(self):
+        events, self.pending = self.pending, []
+        players, self.pending_players = self.pending_players, {}
+        if events or players:
+            self._write(events, players)
+
+    def _write(self, events: list, players: dict):
+        with self._db_lock:
+            try:
+                cursor = self._db.cursor()
+                for guild_id, op, args in events:
+                    cursor.execute(
+                        "INSERT INTO queue_log (guild_id, op, args) VALUES (?, ?, ?)",
+                        (guild_id, op, self._encode(op, args))
+                    )
+                    if op == 'snapshot':
+                        cursor.execute(
+                            "DELETE FROM queue_log WHERE guild_id = ? AND seq < ?",
+                            (guild_id, cursor.lastrowid)
+                        )
+                for guild_id, fields in players.items():
+                    row = cursor.execute(
+                        "SELECT state FROM players WHERE guild_id = ?", (guild_id,)
+                    ).fetchone()
+                    state = json.loads(row[0]) if row else {}
+                    state.update(fields)
+                    cursor.execute(
+                        "INSERT OR REPLACE INTO players (guild_id, state, updated) VALUES (?, ?, ?)",
+                        (guild_id, json.dumps(state), time.time())
+                    )
+                self._db.commit()
+            except sqlite3.Error as e:
+                self._db.rollback()
+                logger.error(f"State flush failed: {str(e)}")
+            finally:
+                self.writing = ([], {})
+
+    def load(self, guild_id: int):
+        """Rebuild a guild's saved state, or None if nothing was saved"""
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT state FROM players WHERE guild_id = ?", (guild_id,)
+            ).fetchone()
+            log = self._db.execute(
+                "SELECT op, args FROM queue_log WHERE guild_id = ? ORDER BY seq", (guild_id,)
+            ).fetchall()
+            writing_events, writing_players = self.writing
+
+        # Include operations that have not been committed yet
+        log += [
+            (op, self._encode(op, args)) for gid, op, args in writing_events + self.pending if gid == guild_id
+        ]
+        state = json.loads(row[0]) if row else {}
+        state.update(writing_players.get(guild_id, {}))
+        state.update(self.pending_players.get(guild_id, {}))
+        if not state and not log:
+            return None
+
+        tracks = []
+        for op, args in log:
+            replay(tracks, op, json.loads(args))
+        state['queue'] = tracks
+        self.journalled[guild_id] = len(log)
+        return state
+
+    def playing_guilds(self) -> list:
+        """Guild ids that were playing when the bot last stopped"""
+        with self._db_lock:
+            rows = self._db.execute("SELECT guild_id, state FROM players").fetchall()
+        return [gid for gid, state in rows if json.loads(state).get('playing')]
+
+
+STATE_DB = os.getenv('STATE_DB')
+STATE_STORE = StateStore(
+    STATE_DB,
+    flush_interval=float(os.getenv('STATE_FLUSH_INTERVAL', '1.0')),
+    compact_after=int(os.getenv('STATE_COMPACT_AFTER', '500'))
+) if STATE_DB else None
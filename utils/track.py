@@ -0,0 +1,232 @@
+import sys
+import random
+from itertools import chain, islice
+
+
+class Track:
+    """Compact, slotted track record"""
+
+    __slots__ = (
+        'id', 'url', 'expires', 'acodec', 'title', 'webpage_url', 'duration', 'thumbnail',
+        'artist', 'album', 'source', 'is_spotify', 'requester', 'requester_avatar', 'requester_id'
+    )
+
+    def __init__(self, title: str = 'Unknown Title', webpage_url: str = '', url: str = None,
+                 id: str = '', expires: float = 0, acodec: str = '', duration: int = 0,
+                 thumbnail: str = '', artist: str = '', album: str = '', source: str = 'youtube',
+                 is_spotify: bool = False, requester: str = None, requester_avatar: str = None,
+                 requester_id: int = None):
+        self.id = id
+        self.url = url
+        self.expires = expires
+        self.acodec = acodec
+        self.title = title
+        self.webpage_url = webpage_url
+        self.duration = duration or 0
+        self.thumbnail = thumbnail
+        self.artist = artist
+        self.album = album
+        self.source = source
+        self.is_spotify = is_spotify
+        self.requester = requester
+        self.requester_avatar = requester_avatar
+        self.requester_id = requester_id
+
+    @classmethod
+    def from_info(cls, info: dict) -> 'Track':
+        """Build a track from a resolver result dict"""
+        return cls(**{k: v for k, v in info.items() if k in cls.__slots__})
+
+    def to_dict(self) -> dict:
+        return {k: getattr(self, k) for k in self.__slots__}
+
+    def set_requester(self, user):
+        # Interned so a user's thousands of queued tracks share one string
+        self.requester = sys.intern(user.display_name)
+        self.requester_avatar = sys.intern(str(user.display_avatar.url))
+        self.requester_id = user.id
+
+    def __repr__(self):
+        return f"<Track {self.id or self.webpage_url} {self.title!r}>"
+
+
+class TrackQueue:
+    """Track queue stored as a list of bounded blocks
+
+    Appends and pops at either end are O(1) amortized; indexed access,
+    removal, insertion and page slicing only walk the block lengths and
+    shift a single block, so they stay cheap for queues of many thousands
+    of tracks. The total duration is kept as a running sum, and `version`
+    changes on every mutation so rendered views can be cached against it.
+    If `journal` is set it is called as journal(op, *args) after each
+    primitive mutation, which is enough to replay the queue elsewhere.
+    Bulk operations rebuild the blocks in one O(n) pass and are journalled
+    as a single 'snapshot' of the result.
+    """
+
+    BLOCK = 256
+
+    def __init__(self, tracks=()):
+        self._blocks = []
+        self._len = 0
+        self.total_duration = 0
+        self.version = 0
+        self.journal = None
+        self.extend(tracks)
+
+    def __len__(self):
+        return self._len
+
+    def __bool__(self):
+        return self._len > 0
+
+    def __iter__(self):
+        return chain.from_iterable(self._blocks)
+
+    def _locate(self, index: int):
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError("queue index out of range")
+        for block_index, block in enumerate(self._blocks):
+            if index < len(block):
+                return block_index, index
+            index -= len(block)
+        raise IndexError("queue index out of range")
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._len)
+            if step != 1:
+                return list(self)[index]
+            return self.slice(start, stop)
+        block_index, offset = self._locate(index)
+        return self._blocks[block_index][offset]
+
+    def __delitem__(self, index: int):
+        self.pop(index)
+
+    def slice(self, start: int, stop: int) -> list:
+        """Return tracks[start:stop] without copying the rest of the queue"""
+        start, stop = max(start, 0), min(stop, self._len)
+        if start >= stop:
+            return []
+        block_index, offset = self._locate(start)
+        tracks = chain.from_iterable(self._blocks[block_index:])
+        return list(islice(tracks, offset, offset + stop - start))
+
+    def append(self, track):
+        if not self._blocks or len(self._blocks[-1]) >= self.BLOCK:
+            self._blocks.append([])
+        self._blocks[-1].append(track)
+        self._added(track)
+        self._log('append', track)
+
+    def appendleft(self, track):
+        if not self._blocks or len(self._blocks[0]) >= self.BLOCK:
+            self._blocks.insert(0, [])
+        self._blocks[0].insert(0, track)
+        self._added(track)
+        self._log('appendleft', track)
+
+    def extend(self, tracks):
+        for track in tracks:
+            self.append(track)
+
+    def insert(self, index: int, track):
+        """Insert a track before position `index` (clamped to the queue bounds)"""
+        if index <= 0:
+            return self.appendleft(track)
+        if index >= self._len:
+            return self.append(track)
+        block_index, offset = self._locate(index)
+        block = self._blocks[block_index]
+        block.insert(offset, track)
+        if len(block) > 2 * self.BLOCK:
+            self._blocks[block_index:block_index + 1] = [block[:self.BLOCK], block[self.BLOCK:]]
+        self._added(track)
+        self._log('insert', index, track)
+
+    def popleft(self):
+        if not self._len:
+            raise IndexError("pop from an empty queue")
+        return self.pop(0)
+
+    def pop(self, index: int = -1):
+        block_index, offset = self._locate(index)
+        block = self._blocks[block_index]
+        track = block.pop(offset)
+        if not block:
+            del self._blocks[block_index]
+        elif block_index + 1 < len(self._blocks):
+            # Merge under-filled neighbours so the block count stays ~n/BLOCK
+            following = self._blocks[block_index + 1]
+            if len(block) + len(following) <= self.BLOCK:
+                block.extend(following)
+                del self._blocks[block_index + 1]
+        self._len -= 1
+        self.total_duration -= track.duration
+        self.version += 1
+        self._log('pop', index)
+        return track
+
+    def move(self, src: int, dst: int):
+        """Move the track at `src` so it ends up at position `dst`"""
+        track = self.pop(src)
+        self.insert(dst, track)
+        return track
+
+    def shuffle(self, start: int = 0):
+        """Shuffle the tracks from position `start` onwards"""
+        tracks = list(self)
+        rest = tracks[start:]
+        random.shuffle(rest)
+        tracks[start:] = rest
+        self._replace(tracks)
+
+    def remove_where(self, predicate, start: int = 0) -> int:
+        """Drop every track from position `start` on matching `predicate`; returns how many were dropped"""
+        tracks = list(self)
+        kept = tracks[:start] + [track for track in tracks[start:] if not predicate(track)]
+        removed = self._len - len(kept)
+        if removed:
+            self._replace(kept)
+        return removed
+
+    def dedupe(self) -> int:
+        """Keep only the first occurrence of each video; returns how many were dropped"""
+        seen = set()
+
+        def repeated(track) -> bool:
+            key = track.id or track.webpage_url
+            if not key:
+                return False
+            if key in seen:
+                return True
+            seen.add(key)
+            return False
+
+        return self.remove_where(repeated)
+
+    def _replace(self, tracks: list):
+        self._blocks = [tracks[i:i + self.BLOCK] for i in range(0, len(tracks), self.BLOCK)]
+        self._len = len(tracks)
+        self.total_duration = sum(track.duration for track in tracks)
+        self.version += 1
+        self._log('snapshot', tracks)
+
+    def clear(self):
+        self._blocks = []
+        self._len = 0
+        self.total_duration = 0
+        self.version += 1
+        self._log('clear')
+
+    def _added(self, track):
+        self._len += 1
+        self.total_duration += track.duration
+        self.version += 1
+
+    def _log(self, op: str, *args):
+        if self.journal is not None:
+            self.journal(op, *args)
@@ -0,0 +1,31 @@
+import discord
+from utils.embed import EmbedGenerator
+
+
+class QueueView(discord.ui.View):
+    """Persistent prev/next buttons for queue embeds
+
+    The view is registered once and serves every queue message; the page
+    a message shows is read back from its embed, so the buttons keep
+    working across restarts.
+    """
+
+    def __init__(self, get_player):
+        super().__init__(timeout=None)
+        self.get_player = get_player
+
+    async def flip(self, interaction: discord.Interaction, step: int):
+        page = 1
+        if interaction.message and interaction.message.embeds:
+            page = EmbedGenerator.queue_page_of(interaction.message.embeds[0])
+        player = self.get_player(interaction.guild_id)
+        embed, _ = player.queue_page(page + step)
+        await interaction.response.edit_message(embed=embed, view=self)
+
+    @discord.ui.button(emoji="◀️", style=discord.ButtonStyle.secondary, custom_id="soundscape:queue:prev")
+    async def previous_page(self, button: discord.ui.Button, interaction: discord.Interaction):
+        await self.flip(interaction, -1)
+
+    @discord.ui.button(emoji="▶️", style=discord.ButtonStyle.secondary, custom_id="soundscape:queue:next")
+    async def next_page(self, button: discord.ui.Button, interaction: discord.Interaction):
+        await self.flip(interaction, 1)
@@ -1,6 +1,27 @@
-import yt_dlp as youtube_dl
+import os
 import re
 import asyncio
+import logging
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from utils.cache import RESOLUTION_CACHE, normalize_query, stream_expiry
+from utils.singleflight import SingleFlight
+from utils.metrics import Counter, Gauge, Histogram
+from utils.track import Track
+
+logger = logging.getLogger('hertz')
+
+# yt-dlp is the slowest import at startup, so it is loaded on first use
+youtube_dl = None
+
+
+def load_youtube_dl():
+    global youtube_dl
+    if youtube_dl is None:
+        import yt_dlp
+        youtube_dl = yt_dlp
+    return youtube_dl
 
 # Optimized options from MusicBot
 YTDL_OPTS = {
@@ -20,42 +41,286 @@ YTDL_OPTS = {
     'geo_bypass': True,
     'buffer_size': '16K',  # MusicBot optimization
     'http_chunk_size': '32K',  # MusicBot optimization
-    'postprocessors': [{
-        'key': 'FFmpegExtractAudio',
-        'preferredcodec': 'mp3',
-        'preferredquality': '192',
-    }],
 }
 
+# Most entries enqueued from one playlist link
+PLAYLIST_LIMIT = int(os.getenv('PLAYLIST_MAX_TRACKS', '1000'))
+
+# Playlists are listed flat: one request returns ids and titles for every
+# entry, and stream URLs are resolved later as tracks near the queue head
+PLAYLIST_OPTS = {
+    **YTDL_OPTS,
+    'noplaylist': False,
+    'extract_flat': 'in_playlist',
+    'playlistend': PLAYLIST_LIMIT,
+}
+
+# Text searches list the top result flat and defer stream extraction
+FAST_SEARCH = os.getenv('YTDL_FAST_SEARCH', 'true').lower() in ('1', 'true')
+SEARCH_OPTS = {**YTDL_OPTS, 'extract_flat': 'in_playlist'}
+
+URL_RE = re.compile(r'https?://')
+PLAYLIST_RE = re.compile(r'https?://(?:www\.|music\.|m\.)?youtube\.com/.*[?&]list=([\w-]+)')
+
+# Flat entries that can never be resolved
+UNAVAILABLE_TITLES = ('[Private video]', '[Deleted video]')
+
+class YTDLPool:
+    """Warm YoutubeDL instances served by a dedicated, bounded executor
+
+    Each worker thread keeps its own YoutubeDL per option set, so instances
+    are reused across extractions without ever being shared between
+    threads. Extraction never touches the loop's default executor.
+    """
+
+    instances = []
+
+    def __init__(self, workers: int, name: str = 'ytdl'):
+        self.name = name
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.active = 0
+        self.completed = 0
+        self.failed = 0
+        self.peak_queued = 0
+        YTDLPool.instances.append(self)
+
+    def _instance(self, opts: dict):
+        instances = getattr(self._local, 'instances', None)
+        if instances is None:
+            instances = self._local.instances = {}
+        ydl = instances.get(id(opts))
+        if ydl is None:
+            ydl = instances[id(opts)] = load_youtube_dl().YoutubeDL(opts)
+        return ydl
+
+    def _run(self, query: str, opts: dict, download: bool, submitted: float):
+        started = time.perf_counter()
+        EXTRACT_WAIT.observe(started - submitted, pool=self.name)
+        with self._lock:
+            self.queued -= 1
+            self.active += 1
+        failed = True
+        try:
+            data = self._instance(opts).extract_info(query, download=download)
+            failed = False
+            return data
+        finally:
+            EXTRACT_SECONDS.observe(
+                time.perf_counter() - started, pool=self.name, result='error' if failed else 'ok'
+            )
+            with self._lock:
+                self.active -= 1
+                if failed:
+                    self.failed += 1
+                else:
+                    self.completed += 1
+
+    async def extract(self, query: str, opts: dict = None, download: bool = False):
+        """Run extract_info on a pooled instance"""
+        with self._lock:
+            self.queued += 1
+            self.peak_queued = max(self.peak_queued, self.queued)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, self._run, query, opts or YTDL_OPTS, download, time.perf_counter()
+        )
+
+    def stats(self) -> dict:
+        return {
+            'workers': self.workers,
+            'queued': self.queued,
+            'active': self.active,
+            'completed': self.completed,
+            'failed': self.failed,
+            'peak_queued': self.peak_queued
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+EXTRACT_SECONDS = Histogram(
+    'soundscape_ytdl_extract_seconds', 'Time spent in yt-dlp extract_info', ('pool', 'result')
+)
+EXTRACT_WAIT = Histogram(
+    'soundscape_ytdl_queue_wait_seconds', 'Time extractions wait for a pool worker', ('pool',)
+)
+Gauge(
+    'soundscape_ytdl_executor_queued', 'Extractions waiting for a pool worker', ('pool',),
+    function=lambda: {(p.name,): p.queued for p in YTDLPool.instances}
+)
+Gauge(
+    'soundscape_ytdl_executor_active', 'Extractions currently running', ('pool',),
+    function=lambda: {(p.name,): p.active for p in YTDLPool.instances}
+)
+Counter(
+    'soundscape_resolution_cache_lookups_total', 'Resolution cache lookups by outcome', ('result',),
+    function=lambda: {
+        ('hit',): RESOLUTION_CACHE.hits,
+        ('stale',): RESOLUTION_CACHE.stale,
+        ('miss',): RESOLUTION_CACHE.misses,
+        ('disk',): RESOLUTION_CACHE.disk_hits
+    }
+)
+
+YTDL_POOL = YTDLPool(int(os.getenv('YTDL_WORKERS', '4')))
+YTDL_FLIGHTS = SingleFlight('ytdl')
+
+def flat_info(entry: dict) -> dict:
+    """Track info from a flat (search or playlist) entry; no stream URL"""
+    thumbnails = entry.get('thumbnails') or [{}]
+    return {
+        'id': entry['id'],
+        'title': entry.get('title') or 'Unknown Title',
+        'webpage_url': entry.get('webpage_url') or entry.get('url')
+        or f"https://www.youtube.com/watch?v={entry['id']}",
+        'duration': int(entry.get('duration') or 0),
+        'thumbnail': entry.get('thumbnail') or thumbnails[-1].get('url', ''),
+        'artist': entry.get('channel') or entry.get('uploader') or '',
+        'source': (entry.get('ie_key') or 'youtube').lower(),
+        'is_spotify': False
+    }
+
 class YTDLSource:
     @staticmethod
-    async def create_source(query: str, loop=None) -> dict:
+    async def create_source(query: str, loop=None) -> Track:
         """Create audio source from query"""
-        loop = loop or asyncio.get_event_loop()
-        with youtube_dl.YoutubeDL(YTDL_OPTS) as ydl:
-            try:
-                # Determine if URL or search
-                if not re.match(r'https?://', query):
-                    query = f'ytsearch:{query}'
-                    
-                # Extract info
-                data = await loop.run_in_executor(None, lambda: ydl.extract_info(query, download=False))
+        # Serve from the resolution cache when possible
+        cached = await RESOLUTION_CACHE.get(query)
+        if cached and cached.get('url'):
+            logger.debug(f"Resolution cache hit for '{query}' ({RESOLUTION_CACHE.stats()})")
+            return Track.from_info(cached)
+
+        # Metadata is known but the stream URL expired: re-resolve the
+        # video page directly instead of repeating the search
+        lookup = cached['webpage_url'] if cached and cached.get('webpage_url') else query
+
+        # Concurrent identical lookups share one extraction
+        return await YTDL_FLIGHTS.do(
+            normalize_query(lookup),
+            lambda: YTDLSource._resolve(query, lookup)
+        )
+
+    @staticmethod
+    async def search(query: str) -> Track:
+        """Find a track with a cheap flat search
+
+        The result carries metadata only; its stream URL is resolved by
+        `refresh` shortly before it plays.
+        """
+        cached = await RESOLUTION_CACHE.get(query)
+        if cached:
+            return Track.from_info(cached)
+        return await YTDL_FLIGHTS.do(
+            f"flat:{normalize_query(query)}",
+            lambda: YTDLSource._search(query)
+        )
+
+    @staticmethod
+    async def _search(query: str) -> Track:
+        results = await YTDLSource.search_candidates(query, 1)
+        if not results:
+            return None
+        RESOLUTION_CACHE.put(query, results[0])
+        return Track.from_info(results[0])
+
+    @staticmethod
+    async def search_candidates(query: str, count: int) -> list:
+        """Flat search returning up to `count` results as track info dicts"""
+        try:
+            data = await YTDL_POOL.extract(f'ytsearch{count}:{query}', SEARCH_OPTS)
+        except Exception as e:
+            logger.error(f"Flat search failed for '{query}': {str(e)}")
+            return []
+        return [flat_info(e) for e in data.get('entries') or [] if e and e.get('id')]
+
+    @staticmethod
+    async def _resolve(query: str, lookup: str) -> Track:
+        try:
+            # Determine if URL or search
+            if not URL_RE.match(lookup):
+                lookup = f'ytsearch:{lookup}'
+                
+            # Extract info on the dedicated pool
+            data = await YTDL_POOL.extract(lookup)
+            
+            # Process entries
+            if 'entries' in data:
+                data = data['entries'][0]
                 
-                # Process entries
-                if 'entries' in data:
-                    data = data['entries'][0]
-                    
-                # Format result
-                return {
-                    'url': data['url'],
-                    'title': data.get('title', 'Unknown Title'),
-                    'webpage_url': data.get('webpage_url', ''),
-                    'duration': data.get('duration', 0),
-                    'thumbnail': data.get('thumbnail', ''),
-                    'artist': data.get('uploader', ''),
-                    'source': data.get('extractor', 'youtube'),
-                    'is_spotify': False
-                }
-            except Exception as e:
-                print(f"YTDL Error: {e}")
-                return None
\ No newline at end of file
+            # Format result
+            source = {
+                'id': data.get('id', ''),
+                'url': data['url'],
+                'expires': stream_expiry(data['url']),
+                'acodec': data.get('acodec', ''),
+                'title': data.get('title', 'Unknown Title'),
+                'webpage_url': data.get('webpage_url', ''),
+                'duration': data.get('duration', 0),
+                'thumbnail': data.get('thumbnail', ''),
+                'artist': data.get('uploader', ''),
+                'source': data.get('extractor', 'youtube'),
+                'is_spotify': False
+            }
+            RESOLUTION_CACHE.put(query, source)
+            return Track.from_info(source)
+        except Exception as e:
+            print(f"YTDL Error: {e}")
+            return None
+
+    @staticmethod
+    def is_playlist(query: str) -> bool:
+        return bool(PLAYLIST_RE.match(query))
+
+    @staticmethod
+    async def create_playlist(url: str):
+        """List a playlist as (title, tracks) without resolving any stream URLs"""
+        try:
+            data = await YTDL_POOL.extract(url, PLAYLIST_OPTS)
+        except Exception as e:
+            logger.error(f"Playlist extraction failed for {url}: {str(e)}")
+            return None, []
+
+        tracks = [
+            Track.from_info(flat_info(entry)) for entry in data.get('entries') or []
+            if entry and entry.get('id') and entry.get('title') not in UNAVAILABLE_TITLES
+        ]
+        return data.get('title') or 'playlist', tracks
+
+    @staticmethod
+    async def warm(url: str, within: float) -> bool:
+        """Re-resolve a URL unless its cached stream stays valid for `within` seconds"""
+        expires = RESOLUTION_CACHE.stream_expires(url)
+        if expires - RESOLUTION_CACHE.STREAM_MARGIN > time.time() + within:
+            return False
+        track = await YTDL_FLIGHTS.do(normalize_query(url), lambda: YTDLSource._resolve(url, url))
+        return track is not None
+
+    @staticmethod
+    def needs_refresh(track: Track, within: float = 0) -> bool:
+        """Check whether a track's stream URL is missing or expires within `within` seconds"""
+        if not track.url:
+            return True
+        if not track.expires:
+            return False
+        return track.expires - RESOLUTION_CACHE.STREAM_MARGIN < time.time() + within
+
+    @staticmethod
+    async def refresh(track: Track, within: float = 0) -> bool:
+        """Re-resolve a track's stream URL in place if it is about to expire"""
+        if not YTDLSource.needs_refresh(track, within):
+            return True
+        fresh = await YTDLSource.create_source(track.webpage_url or track.title)
+        if not fresh:
+            return False
+        track.url = fresh.url
+        track.expires = fresh.expires
+        track.acodec = fresh.acodec
+        # Playlist placeholders only carry flat metadata
+        track.thumbnail = track.thumbnail or fresh.thumbnail
+        track.artist = track.artist or fresh.artist
+        return True